@@ -1,5 +1,7 @@
 __version__ = '0.1.0'
 
-from .aggregation import get_all_musical_features
+from .aggregation import get_all_musical_features, get_preset, PRESETS
+from .similarity import SimilarityIndex
+from .realtime import RealtimeExtractor
 
-from . import aggregation, features, feature_stats, visualization
+from . import aggregation, features, feature_stats, visualization, similarity, benchmark, realtime, service, fingerprint, pipeline
@@ -11,12 +11,12 @@ def get_df_spec_features(y, sr=22050, n_fft=2048, hop_length=512, n_contrast_ban
     :param n_contrast_bands: the number of spectral contrast sub-bands
     :return: (DataFrame)
     """
-    spec_centr = get_spectral_centroids(y=y, sr=sr)
-    spec_bw = get_spectral_bandwidth(y=y, sr=sr)
-    spec_rolloff_max = get_spectral_rolloff(y=y, sr=sr, roll_percent=.99)
-    spec_rolloff_min = get_spectral_rolloff(y=y, sr=sr, roll_percent=.01)
+    spec_centr = get_spectral_centroids(y=y, sr=sr, n_fft=n_fft, hop_length=hop_length)
+    spec_bw = get_spectral_bandwidth(y=y, sr=sr, n_fft=n_fft, hop_length=hop_length)
+    spec_rolloff_max = get_spectral_rolloff(y=y, sr=sr, roll_percent=.99, n_fft=n_fft, hop_length=hop_length)
+    spec_rolloff_min = get_spectral_rolloff(y=y, sr=sr, roll_percent=.01, n_fft=n_fft, hop_length=hop_length)
     spec_flat = get_spectral_flatness(y=y, n_fft=n_fft, hop_length=hop_length)
-    spec_contrast = get_spectral_contrast(y=y, sr=sr, n_bands=n_contrast_bands)
+    spec_contrast = get_spectral_contrast(y=y, sr=sr, n_bands=n_contrast_bands, n_fft=n_fft, hop_length=hop_length)
 
     spec_features = [spec_centr, spec_bw, spec_rolloff_max, spec_rolloff_min, spec_flat]
     for i in range(n_contrast_bands+1):
@@ -31,39 +31,49 @@ def get_df_spec_features(y, sr=22050, n_fft=2048, hop_length=512, n_contrast_ban
     return df_spec_feat
 
 
-def get_df_mfcc(y, sr=22050, n_mfcc=20):
+def get_df_mfcc(y, sr=22050, n_mfcc=20, n_fft=2048, hop_length=512):
     """
     get_df_mfcc
     :param y:
     :param sr:
     :param n_mfcc: the number of MFCCs
+    :param n_fft:
+    :param hop_length:
     :return: (DataFrame)
     """
-    mfccs = get_mfcc(y=y, sr=sr, n_mfcc=n_mfcc)
+    mfccs = get_mfcc(y=y, sr=sr, n_mfcc=n_mfcc, n_fft=n_fft, hop_length=hop_length)
     df_mfcc = pd.DataFrame(np.array(mfccs).T, columns=[f"mfcc_{i}" for i in range(1, n_mfcc+1)])
     return df_mfcc
 
 
-def get_df_chroma_features(y_harm, sr=22050, hop_length=512, method_list=['stft']):
+def get_df_chroma_features(y_harm, sr=22050, hop_length=512, method_list=['stft'], n_fft=2048,
+                           tonnetz_method='cqt'):
     """
 
     :param y_harm: harmonic part of y (recommended)
     :param sr:
     :param hop_length:
     :param method_list: list of strings in ['stft','cqt','cens']
+    :param n_fft: FFT window of the 'stft' chromagram
+    :param tonnetz_method: chromagram used for the tonnetz, 'cqt' or 'stft' (faster)
     :return: (DataFrame)
     """
     pitch_class = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
     tonnetz_class = ['fifth_x', 'fifth_y', 'minor_x', 'minor_y', 'major_x', 'major_y']
 
     df_chroma_list = []
+    chromagrams = {}
     for m in method_list:
-        chromagram = get_chromagram(y=y_harm, sr=sr, hop_length=hop_length, method=m)
-        df_chroma_ = pd.DataFrame(np.array(chromagram).T, columns=[f"chroma_{m}_{i}" for i in pitch_class])
+        chromagrams[m] = get_chromagram(y=y_harm, sr=sr, hop_length=hop_length, method=m, n_fft=n_fft)
+        df_chroma_ = pd.DataFrame(np.array(chromagrams[m]).T, columns=[f"chroma_{m}_{i}" for i in pitch_class])
         df_chroma_list.append(df_chroma_)
     df_chromagrams = pd.concat(df_chroma_list, axis=1)
 
-    tonnetz = get_tonnetz(y=y_harm, sr=sr)
+    # reuse the chromagram if it is already computed
+    if tonnetz_method not in chromagrams:
+        chromagrams[tonnetz_method] = get_chromagram(y=y_harm, sr=sr, hop_length=hop_length, method=tonnetz_method,
+                                                     n_fft=n_fft)
+    tonnetz = get_tonnetz(y=y_harm, sr=sr, chroma=chromagrams[tonnetz_method])
     df_tonnetz = pd.DataFrame(np.array(tonnetz.T), columns=[f'tonnetz_{i}' for i in tonnetz_class])
 
     df_chrom_feat = pd.concat([df_chromagrams, df_tonnetz], axis=1)
@@ -81,84 +91,132 @@ def get_df_energy_features(y, sr=22050, frame_length=2048, hop_length=512):
     """
     zcr = get_zero_crossing_rate(y=y, frame_length=frame_length, hop_length=hop_length)
     rms = get_rms(y=y, frame_length=frame_length, hop_length=hop_length)
-    onset_str = get_onset_strength(y=y, sr=sr)
+    onset_str = get_onset_strength(y=y, sr=sr, n_fft=frame_length, hop_length=hop_length)
     df_energy_feat = pd.DataFrame({'zero_crossing_rate': zcr, 'rms': rms, 'onset_strength': onset_str})
     return df_energy_feat
 
 
-def get_df_bpms(y_perc, sr=22050, start_bpms=[60, 90, 120], song_name='song_name'):
+def get_df_bpms(y_perc, sr=22050, start_bpms=[60, 90, 120], song_name='song_name', hop_length=512):
     """
     get_df_bpms
     :param y_perc:: percussive part of y (recommended)
     :param sr:
     :param start_bpms: (list) list of initial bpm for estimation
     :param song_name:
+    :param hop_length:
     :return: (DataFrame)
     """
     bpms = []
     for i in start_bpms:
-        bpm_ = get_bpm(y_perc, sr=sr, start_bpm=i)
+        bpm_ = get_bpm(y_perc, sr=sr, start_bpm=i, hop_length=hop_length)
         bpms.append(bpm_)
     df_bpms = pd.DataFrame(np.array(bpms), index=[f'bpm_s{i}' for i in start_bpms], columns=[song_name])
     return df_bpms
 
 
-def _get_all_raw_feats_from_y(y, y_harm, y_perc,
-                              chroma_method_list=['stft', 'cqt', 'cens'],
+PRESETS = {
+    'full': {'sr': 22050, 'n_fft': 2048, 'hop_length': 512, 'hpss_kernel_size': 31,
+             'chroma_method_list': ['stft', 'cqt', 'cens'], 'tonnetz_method': 'cqt', 'start_bpms': [60, 120, 180]},
+    'balanced': {'sr': 22050, 'n_fft': 2048, 'hop_length': 1024, 'hpss_kernel_size': 17,
+                 'chroma_method_list': ['stft', 'cqt'], 'tonnetz_method': 'cqt', 'start_bpms': [120]},
+    'fast': {'sr': 11025, 'n_fft': 1024, 'hop_length': 512, 'hpss_kernel_size': 11,
+             'chroma_method_list': ['stft'], 'tonnetz_method': 'stft', 'start_bpms': [120]},
+}
+
+
+def get_preset(preset='full', **kwargs):
+    """
+    Settings of an extraction preset, see ``PRESETS``.
+
+    'full' is the most accurate, 'balanced' and 'fast' trade fidelity for speed
+    (larger hop in seconds, fewer chromagrams, a single bpm prior, smaller HPSS kernels;
+    'fast' also downsamples to 11025 Hz and uses an STFT chromagram for the tonnetz).
+
+    :param preset: (string) one of ['full', 'balanced', 'fast']
+    :param kwargs: settings that override the preset (None values are ignored)
+    :return: (dict)
+    """
+    if preset not in PRESETS:
+        raise Exception(f"preset: {list(PRESETS)}")
+    settings = dict(PRESETS[preset])
+    for k, v in kwargs.items():
+        if k not in settings:
+            raise Exception(f"unknown preset setting: {k}")
+        if v is not None:
+            settings[k] = v
+    return settings
+
+
+def _get_all_raw_feats_from_y(y, y_harm, y_perc, sr=22050, n_fft=2048, hop_length=512,
+                              chroma_method_list=['stft', 'cqt', 'cens'], tonnetz_method='cqt',
                               n_contrast_bands=4, n_mfcc=12, start_bpms=[60, 120, 180],
                               chroma_harm=True, bpm_perc=True
                               ):
-    raw_df_spec_feat = get_df_spec_features(y=y, n_contrast_bands=n_contrast_bands)
-    raw_df_mfcc_feat = get_df_mfcc(y=y, n_mfcc=n_mfcc)
+    raw_df_spec_feat = get_df_spec_features(y=y, sr=sr, n_fft=n_fft, hop_length=hop_length,
+                                            n_contrast_bands=n_contrast_bands)
+    raw_df_mfcc_feat = get_df_mfcc(y=y, sr=sr, n_mfcc=n_mfcc, n_fft=n_fft, hop_length=hop_length)
     if chroma_harm is False:
-        raw_df_chroma_feat = get_df_chroma_features(y_harm=y, method_list=chroma_method_list)
+        raw_df_chroma_feat = get_df_chroma_features(y_harm=y, sr=sr, hop_length=hop_length, n_fft=n_fft,
+                                                    method_list=chroma_method_list, tonnetz_method=tonnetz_method)
     else:
-        raw_df_chroma_feat = get_df_chroma_features(y_harm=y_harm, method_list=chroma_method_list)
-    raw_df_energy_feat = get_df_energy_features(y=y)
+        raw_df_chroma_feat = get_df_chroma_features(y_harm=y_harm, sr=sr, hop_length=hop_length, n_fft=n_fft,
+                                                    method_list=chroma_method_list, tonnetz_method=tonnetz_method)
+    raw_df_energy_feat = get_df_energy_features(y=y, sr=sr, frame_length=n_fft, hop_length=hop_length)
     if bpm_perc is False:
-        raw_df_bpm_feat = get_df_bpms(y_perc=y, start_bpms=start_bpms)
+        raw_df_bpm_feat = get_df_bpms(y_perc=y, sr=sr, start_bpms=start_bpms, hop_length=hop_length)
     else:
-        raw_df_bpm_feat = get_df_bpms(y_perc=y_perc, start_bpms=start_bpms)
+        raw_df_bpm_feat = get_df_bpms(y_perc=y_perc, sr=sr, start_bpms=start_bpms, hop_length=hop_length)
     out = (raw_df_spec_feat, raw_df_mfcc_feat, raw_df_chroma_feat, raw_df_energy_feat, raw_df_bpm_feat)
     return out
 
 
-def _get_all_raw_sep_feats_from_y(y_harm, y_perc,
-                                  chroma_method_list=['stft', 'cqt', 'cens'],
+def _get_all_raw_sep_feats_from_y(y_harm, y_perc, sr=22050, n_fft=2048, hop_length=512,
+                                  chroma_method_list=['stft', 'cqt', 'cens'], tonnetz_method='cqt',
                                   n_contrast_bands=4, n_mfcc=12, start_bpms=[60, 120, 180],
                                   chroma_harm=True, bpm_perc=True
                                   ):
-    raw_df_spec_feat_harm = get_df_spec_features(y_harm, n_contrast_bands=n_contrast_bands).rename(
+    raw_df_spec_feat_harm = get_df_spec_features(y_harm, sr=sr, n_fft=n_fft, hop_length=hop_length,
+                                                 n_contrast_bands=n_contrast_bands).rename(
         columns=lambda x: x + '_harm')
-    raw_df_spec_feat_perc = get_df_spec_features(y_perc, n_contrast_bands=n_contrast_bands).rename(
+    raw_df_spec_feat_perc = get_df_spec_features(y_perc, sr=sr, n_fft=n_fft, hop_length=hop_length,
+                                                 n_contrast_bands=n_contrast_bands).rename(
         columns=lambda x: x + '_perc')
     raw_df_spec_feat = pd.concat([raw_df_spec_feat_harm, raw_df_spec_feat_perc], axis=1)
 
-    raw_df_mfcc_feat_harm = get_df_mfcc(y_harm, n_mfcc=n_mfcc).rename(columns=lambda x: x + '_harm')
-    raw_df_mfcc_feat_perc = get_df_mfcc(y_perc, n_mfcc=n_mfcc).rename(columns=lambda x: x + '_perc')
+    raw_df_mfcc_feat_harm = get_df_mfcc(y_harm, sr=sr, n_mfcc=n_mfcc, n_fft=n_fft, hop_length=hop_length).rename(
+        columns=lambda x: x + '_harm')
+    raw_df_mfcc_feat_perc = get_df_mfcc(y_perc, sr=sr, n_mfcc=n_mfcc, n_fft=n_fft, hop_length=hop_length).rename(
+        columns=lambda x: x + '_perc')
     raw_df_mfcc_feat = pd.concat([raw_df_mfcc_feat_harm, raw_df_mfcc_feat_perc], axis=1)
 
     if chroma_harm is False:
-        raw_df_chroma_feat_harm = get_df_chroma_features(y_harm, method_list=chroma_method_list).rename(
+        raw_df_chroma_feat_harm = get_df_chroma_features(y_harm, sr=sr, hop_length=hop_length, n_fft=n_fft,
+                                                         method_list=chroma_method_list,
+                                                         tonnetz_method=tonnetz_method).rename(
             columns=lambda x: x + '_harm')
-        raw_df_chroma_feat_perc = get_df_chroma_features(y_perc, method_list=chroma_method_list).rename(
+        raw_df_chroma_feat_perc = get_df_chroma_features(y_perc, sr=sr, hop_length=hop_length, n_fft=n_fft,
+                                                         method_list=chroma_method_list,
+                                                         tonnetz_method=tonnetz_method).rename(
             columns=lambda x: x + '_perc')
         raw_df_chroma_feat = pd.concat([raw_df_chroma_feat_harm, raw_df_chroma_feat_perc], axis=1)
     else:
-        raw_df_chroma_feat = get_df_chroma_features(y_harm=y_harm, method_list=chroma_method_list)
+        raw_df_chroma_feat = get_df_chroma_features(y_harm=y_harm, sr=sr, hop_length=hop_length, n_fft=n_fft,
+                                                    method_list=chroma_method_list, tonnetz_method=tonnetz_method)
 
-    raw_df_energy_feat_harm = get_df_energy_features(y_harm).rename(columns=lambda x: x + '_harm')
-    raw_df_energy_feat_perc = get_df_energy_features(y_perc).rename(columns=lambda x: x + '_perc')
+    raw_df_energy_feat_harm = get_df_energy_features(y_harm, sr=sr, frame_length=n_fft, hop_length=hop_length).rename(
+        columns=lambda x: x + '_harm')
+    raw_df_energy_feat_perc = get_df_energy_features(y_perc, sr=sr, frame_length=n_fft, hop_length=hop_length).rename(
+        columns=lambda x: x + '_perc')
     raw_df_energy_feat = pd.concat([raw_df_energy_feat_harm, raw_df_energy_feat_perc], axis=1)
 
     if bpm_perc is False:
-        raw_df_bpm_feat_harm = get_df_bpms(y_harm, start_bpms=start_bpms).rename(
+        raw_df_bpm_feat_harm = get_df_bpms(y_harm, sr=sr, start_bpms=start_bpms, hop_length=hop_length).rename(
             columns=lambda x: x + '_harm')
-        raw_df_bpm_feat_perc = get_df_bpms(y_perc, start_bpms=start_bpms).rename(
+        raw_df_bpm_feat_perc = get_df_bpms(y_perc, sr=sr, start_bpms=start_bpms, hop_length=hop_length).rename(
             columns=lambda x: x + '_perc')
         raw_df_bpm_feat = pd.concat([raw_df_bpm_feat_harm, raw_df_bpm_feat_perc], axis=1)
     else:
-        raw_df_bpm_feat = get_df_bpms(y_perc=y_perc, start_bpms=start_bpms)
+        raw_df_bpm_feat = get_df_bpms(y_perc=y_perc, sr=sr, start_bpms=start_bpms, hop_length=hop_length)
     out = (raw_df_spec_feat, raw_df_mfcc_feat, raw_df_chroma_feat, raw_df_energy_feat, raw_df_bpm_feat)
     return out
 
@@ -174,14 +232,53 @@ def _get_stats_from_raw_feats(_all_raw_feats, song_name, stats=None):
     return audio_features
 
 
+def _get_all_musical_features_from_y(y, song_name, stats=None,
+                                     from_harm_perc=False,
+                                     chroma_harm=True, bpm_perc=True,
+                                     hpr_margin=1.5, preset='full',
+                                     sr=None, n_fft=None, hop_length=None, hpss_kernel_size=None,
+                                     chroma_method_list=None, tonnetz_method=None,
+                                     n_contrast_bands=4, n_mfcc=12, start_bpms=None):
+    """
+    Same as ``get_all_musical_features``, from an already loaded audio time series ``y`` (sampled at ``sr``)
+    """
+    settings = get_preset(preset, sr=sr, n_fft=n_fft, hop_length=hop_length, hpss_kernel_size=hpss_kernel_size,
+                          chroma_method_list=chroma_method_list, tonnetz_method=tonnetz_method,
+                          start_bpms=start_bpms)
+    y_harm, y_perc = hpss(y=y, margin=hpr_margin, kernel_size=settings['hpss_kernel_size'])
+
+    if from_harm_perc is True:
+        _all_raw_feats = _get_all_raw_sep_feats_from_y(y_harm, y_perc,
+                                                       sr=settings['sr'], n_fft=settings['n_fft'],
+                                                       hop_length=settings['hop_length'],
+                                                       chroma_method_list=settings['chroma_method_list'],
+                                                       tonnetz_method=settings['tonnetz_method'],
+                                                       n_contrast_bands=n_contrast_bands, n_mfcc=n_mfcc,
+                                                       start_bpms=settings['start_bpms'],
+                                                       chroma_harm=chroma_harm, bpm_perc=bpm_perc)
+    else:
+        _all_raw_feats = _get_all_raw_feats_from_y(y, y_harm, y_perc,
+                                                   sr=settings['sr'], n_fft=settings['n_fft'],
+                                                   hop_length=settings['hop_length'],
+                                                   chroma_method_list=settings['chroma_method_list'],
+                                                   tonnetz_method=settings['tonnetz_method'],
+                                                   n_contrast_bands=n_contrast_bands, n_mfcc=n_mfcc,
+                                                   start_bpms=settings['start_bpms'],
+                                                   chroma_harm=chroma_harm, bpm_perc=bpm_perc)
+    audio_features = _get_stats_from_raw_feats(_all_raw_feats, song_name, stats=stats)
+    return audio_features
+
+
 # overall
 def get_all_musical_features(path_audio, song_name, stats=None,
                              duration=30, start=10,
                              from_harm_perc=False,
                              chroma_harm=True, bpm_perc=True,
-                             sr=22050, hpr_margin=1.5,
-                             chroma_method_list=['stft', 'cqt', 'cens'],
-                             n_contrast_bands=4, n_mfcc=12, start_bpms=[60, 120, 180]):
+                             sr=None, hpr_margin=1.5,
+                             chroma_method_list=None,
+                             n_contrast_bands=4, n_mfcc=12, start_bpms=None,
+                             preset='full', n_fft=None, hop_length=None, hpss_kernel_size=None,
+                             tonnetz_method=None):
     """
     Get all musical features from audio file. The features extracted using Librosa.
 
@@ -217,17 +314,17 @@ def get_all_musical_features(path_audio, song_name, stats=None,
         If True, for the extraction of percussive features, you use only percussive parts (recommended)
         Default is True
 
-    :param sr: (int)
+    :param sr: (int or None)
         Sampling rate
-        Default is 22050 (recommended)
+        Default is None, which uses the preset (22050 for 'full', recommended)
 
     :param hpr_margin: (float)
         Harmony-Percussive-Residual margin for decomposition / Should be a float over 1
         Default is 1.5
 
-    :param chroma_method_list: (list)
+    :param chroma_method_list: (list or None)
         A method used for obtain chromagram / choose one or multiple in ['stft', 'cqt', 'cens']
-        Default is ['stft', 'cqt', 'cens']
+        Default is None, which uses the preset (['stft', 'cqt', 'cens'] for 'full')
 
     :param n_contrast_bands: (int)
         Number of sub-bands to extract from Spectral Contrast
@@ -237,9 +334,26 @@ def get_all_musical_features(path_audio, song_name, stats=None,
         Number of MFCC to extract
         Default is 12
 
-    :param start_bpms: (list)
+    :param start_bpms: (list or None)
         list of initial bpms to estimate bpm / Can be one or many
-        Default is [60, 120, 180]
+        Default is None, which uses the preset ([60, 120, 180] for 'full')
+
+    :param preset: (string)
+        Extraction preset in ['full', 'balanced', 'fast'] (see ``PRESETS``)
+        'balanced' and 'fast' are faster with lower fidelity; explicitly given settings override the preset
+        Default is 'full'
+
+    :param n_fft: (int or None)
+        FFT window size / None uses the preset (2048 for 'full')
+
+    :param hop_length: (int or None)
+        Number of samples between frames / None uses the preset (512 for 'full')
+
+    :param hpss_kernel_size: (int or None)
+        Median filter size of the HPSS / None uses the preset (31 for 'full')
+
+    :param tonnetz_method: (string or None)
+        Chromagram used for the tonnetz in ['cqt', 'stft'] / None uses the preset ('cqt' for 'full')
 
     Return
     -------
@@ -247,18 +361,16 @@ def get_all_musical_features(path_audio, song_name, stats=None,
         DataFrame of n features (n rows × 1 columns)
 
     """
+    sr = get_preset(preset, sr=sr)['sr']
     y = get_y_from_audio(path_audio, sr=sr, duration=duration, start=start)
-    y_harm, y_perc = hpss(y=y, margin=hpr_margin)
-
-    _all_raw_feats = _get_all_raw_feats_from_y(y, y_harm, y_perc,
-                                               chroma_method_list=chroma_method_list,
-                                               n_contrast_bands=n_contrast_bands, n_mfcc=n_mfcc, start_bpms=start_bpms,
-                                               chroma_harm=chroma_harm, bpm_perc=bpm_perc)
-    if from_harm_perc is True:
-        _all_raw_feats = _get_all_raw_sep_feats_from_y(y_harm, y_perc,
-                                                       chroma_method_list=chroma_method_list,
-                                                       n_contrast_bands=n_contrast_bands, n_mfcc=n_mfcc,
-                                                       start_bpms=start_bpms,
-                                                       chroma_harm=chroma_harm, bpm_perc=bpm_perc)
-    audio_features = _get_stats_from_raw_feats(_all_raw_feats, song_name, stats=stats)
+    audio_features = _get_all_musical_features_from_y(y, song_name, stats=stats,
+                                                      from_harm_perc=from_harm_perc,
+                                                      chroma_harm=chroma_harm, bpm_perc=bpm_perc,
+                                                      hpr_margin=hpr_margin, preset=preset,
+                                                      sr=sr, n_fft=n_fft, hop_length=hop_length,
+                                                      hpss_kernel_size=hpss_kernel_size,
+                                                      chroma_method_list=chroma_method_list,
+                                                      tonnetz_method=tonnetz_method,
+                                                      n_contrast_bands=n_contrast_bands, n_mfcc=n_mfcc,
+                                                      start_bpms=start_bpms)
     return audio_features
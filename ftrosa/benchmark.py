@@ -0,0 +1,154 @@
+import time
+
+import numpy as np
+import pandas as pd
+
+from .similarity import SimilarityIndex, _sq_distances, _merge_topk
+from .aggregation import get_all_musical_features
+
+
+def _make_clustered_vectors(n_features=405, n_latent=24, n_groups=200, random_state=0):
+    """
+    Synthetic feature vectors with a low-dimensional clustered structure,
+    similar to the aggregate vectors of ``get_all_musical_features``.
+    """
+    rng = np.random.default_rng(random_state)
+    W = rng.normal(size=(n_latent, n_features)).astype(np.float32)
+    centers = rng.normal(scale=3.0, size=(n_groups, n_latent)).astype(np.float32)
+
+    def _chunk(n, seed):
+        rng_ = np.random.default_rng(seed)
+        Z = centers[rng_.integers(n_groups, size=n)] + rng_.normal(size=(n, n_latent)).astype(np.float32)
+        return Z @ W + rng_.normal(scale=0.5, size=(n, n_features)).astype(np.float32)
+    return _chunk
+
+
+def benchmark_similarity_index(n_tracks_list=(100000, 1000000), n_features=405, n_queries=1000, k=10,
+                               n_components=32, n_clusters=None, n_probe_list=(1, 4, 16),
+                               chunk_size=100000, random_state=0):
+    """
+    Compare query latency and recall of approximate (IVF) search against exact search
+    of ``SimilarityIndex`` on synthetic catalogues.
+
+    The index is fitted on the first chunk of tracks and the rest are added with ``add``,
+    in the same way a growing catalogue would be indexed.
+
+    Recall is measured against exact search on the standardised vectors without PCA, so the
+    ``exact`` rows show the loss of the PCA projection alone and the ``ivf`` rows the total loss.
+
+    :param n_tracks_list: (list) catalogue sizes to benchmark
+    :param n_features: (int) number of raw features per track (405 with the default ``get_all_musical_features``)
+    :param n_queries: (int) number of query tracks
+    :param k: (int) number of neighbours
+    :param n_components: (int or None) PCA components of the index
+    :param n_clusters: (int or None) number of k-means clusters / None uses 4 * sqrt(n_tracks)
+    :param n_probe_list: (list) numbers of clusters scanned per query
+    :param chunk_size: (int) number of tracks generated and added at a time
+    :param random_state: (int)
+    :return: (DataFrame) one row per (n_tracks, method, n_probe) with build time, latency and recall@k
+        (method ``exact`` is the exact search of the index, in the PCA space)
+    """
+    rows = []
+    for n_tracks in n_tracks_list:
+        make_chunk = _make_clustered_vectors(n_features=n_features, random_state=random_state)
+        n_clusters_ = int(4 * np.sqrt(n_tracks)) if n_clusters is None else n_clusters
+
+        queries = make_chunk(n_queries, random_state + n_tracks)
+
+        build_time = 0.0
+        index = SimilarityIndex(n_components=n_components, n_clusters=n_clusters_, random_state=random_state)
+        for s in range(0, n_tracks, chunk_size):
+            n = min(chunk_size, n_tracks - s)
+            chunk = make_chunk(n, random_state + s)
+            t0 = time.perf_counter()
+            if s == 0:
+                index.fit(chunk, names=np.arange(n))
+                Q = _standardize(index, queries)
+                true_d = np.full((n_queries, 0), np.inf, dtype=np.float32)
+                true_i = np.full((n_queries, 0), -1, dtype=np.int64)
+            else:
+                index.add(chunk, names=np.arange(s, s + n))
+            build_time += time.perf_counter() - t0
+            # ground truth: exact search on the standardised vectors, without PCA
+            X = _standardize(index, chunk)
+            d = _sq_distances(Q, X, np.einsum('ij,ij->i', X, X))
+            true_d, true_i = _merge_topk(true_d, true_i, d, np.broadcast_to(np.arange(s, s + n), d.shape), k)
+        true_sets = [set(r.astype(str)) for r in true_i]
+
+        def _recall(neighbours):
+            return np.mean([len(t & set(r)) / k for t, r in zip(true_sets, neighbours.to_numpy())])
+
+        t0 = time.perf_counter()
+        exact, _ = index.query(queries, k=k, exact=True)
+        exact_time = time.perf_counter() - t0
+        rows.append({'n_tracks': n_tracks, 'method': 'exact', 'n_probe': None, 'build_time': build_time,
+                     'query_ms': 1000 * exact_time / n_queries, 'recall': _recall(exact)})
+
+        for n_probe in n_probe_list:
+            t0 = time.perf_counter()
+            approx, _ = index.query(queries, k=k, exact=False, n_probe=n_probe)
+            approx_time = time.perf_counter() - t0
+            rows.append({'n_tracks': n_tracks, 'method': 'ivf', 'n_probe': n_probe, 'build_time': build_time,
+                         'query_ms': 1000 * approx_time / n_queries, 'recall': _recall(approx)})
+    return pd.DataFrame(rows)
+
+
+def _standardize(index, X):
+    """Standardised vectors of a fitted ``SimilarityIndex``, without the PCA projection"""
+    return np.nan_to_num((X - index.mean) / index.scale, nan=0.0, posinf=0.0, neginf=0.0).astype(np.float32)
+
+
+def benchmark_preset(paths_audio, presets=('fast', 'balanced'), reference='full', song_names=None, **kwargs):
+    """
+    Measure the throughput of the extraction presets and the per-feature deviation
+    from the reference preset on a local corpus.
+
+    Every preset extracts the first track once before the timing, so that the JIT compilation is not counted.
+
+    :param paths_audio: (list) file paths of the audios
+    :param presets: (list) presets to evaluate
+    :param reference: (string) reference preset
+    :param song_names: (list or None) song names / None uses the file paths
+    :param kwargs: other parameters of ``get_all_musical_features`` (applied to every preset)
+    :return: (df_throughput, df_deviation)
+        df_throughput: one row per preset with seconds per track, tracks per second and speedup over the reference
+        df_deviation: one row per (preset, feature) shared with the reference, with the mean absolute error,
+        the relative error (MAE / mean absolute reference value) and the correlation over tracks
+    """
+    if song_names is None:
+        song_names = list(paths_audio)
+
+    features, times = {}, {}
+    for preset in [reference] + [p for p in presets if p != reference]:
+        # warm-up (numba JIT, caches) outside of the timing
+        get_all_musical_features(paths_audio[0], song_names[0], preset=preset, **kwargs)
+        t0 = time.perf_counter()
+        features[preset] = pd.concat([get_all_musical_features(path_audio, song_name, preset=preset, **kwargs)
+                                      for path_audio, song_name in zip(paths_audio, song_names)], axis=1)
+        times[preset] = time.perf_counter() - t0
+
+    n_tracks = len(song_names)
+    df_throughput = pd.DataFrame({'sec_per_track': {p: t / n_tracks for p, t in times.items()},
+                                  'tracks_per_sec': {p: n_tracks / t for p, t in times.items()},
+                                  'speedup': {p: times[reference] / t for p, t in times.items()}})
+    df_throughput.index.name = 'preset'
+
+    df_ref = features[reference]
+    list_deviation = []
+    for preset in presets:
+        if preset == reference:
+            continue
+        common = df_ref.index.intersection(features[preset].index)
+        ref, approx = df_ref.loc[common], features[preset].loc[common]
+        mae = (approx - ref).abs().mean(axis=1)
+        df_deviation_ = pd.DataFrame({'mae': mae,
+                                      'rel_error': mae / (ref.abs().mean(axis=1) + 1e-12),
+                                      'corr': ref.T.corrwith(approx.T) if n_tracks > 2 else np.nan})
+        df_deviation_.index = pd.MultiIndex.from_product([[preset], common], names=['preset', 'feature'])
+        list_deviation.append(df_deviation_)
+    df_deviation = pd.concat(list_deviation, axis=0) if len(list_deviation) > 0 else pd.DataFrame()
+    return df_throughput, df_deviation
+
+
+if __name__ == '__main__':
+    print(benchmark_similarity_index().to_string())
@@ -9,7 +9,7 @@ def get_y_from_audio(path_audio, sr=22050, duration=30, start=10, trim=True):
     return y
 
 
-def hpss(y, margin=1.0):
+def hpss(y, margin=1.0, kernel_size=31):
     """
     Median-filtering harmonic percussive source separation (HPSS).
 
@@ -19,8 +19,10 @@ def hpss(y, margin=1.0):
 
     If ``margin > 1.0``, decomposes an input spectrogram ``S = H + P + R``
     where ``R`` contains residual components not included in ``H`` or ``P``.
+
+    ``kernel_size`` is the size of the median filters (smaller is faster).
     """
-    y_harm, y_perc = librosa.effects.hpss(y=y, margin=margin)
+    y_harm, y_perc = librosa.effects.hpss(y=y, margin=margin, kernel_size=kernel_size)
     out = (y_harm, y_perc)
     return out
 
@@ -46,7 +48,7 @@ def stft_mag(y, n_fft=2048, hop_length=None, window='hann', center=True,
     return out
 
 
-def get_spectral_centroids(y, sr=22050):
+def get_spectral_centroids(y, sr=22050, n_fft=2048, hop_length=512):
     """
     Compute the spectral centroid.
 
@@ -55,21 +57,21 @@ def get_spectral_centroids(y, sr=22050):
     extracted per frame.
     """
     # Calculate the Spectral Centroids
-    spec_centr = librosa.feature.spectral_centroid(y=y, sr=sr)[0]
+    spec_centr = librosa.feature.spectral_centroid(y=y, sr=sr, n_fft=n_fft, hop_length=hop_length)[0]
     return spec_centr
 
 
-def get_spectral_bandwidth(y, sr=22050, p=2):
+def get_spectral_bandwidth(y, sr=22050, p=2, n_fft=2048, hop_length=512):
     """
     Compute p'th-order spectral bandwidth.
     """
     # Calculate the Spectral Centroids
-    spec_bw = librosa.feature.spectral_bandwidth(y=y, sr=sr, p=p)[0]
+    spec_bw = librosa.feature.spectral_bandwidth(y=y, sr=sr, p=p, n_fft=n_fft, hop_length=hop_length)[0]
     return spec_bw
 
 
 def get_spectral_contrast(y, sr=22050,
-                          n_bands=6, quantile=0.02):
+                          n_bands=6, quantile=0.02, n_fft=2048, hop_length=512):
     """
     Compute spectral contrast
 
@@ -88,7 +90,8 @@ def get_spectral_contrast(y, sr=22050,
         octave-based frequency
     """
     # Calculate the Spectral Centroids
-    spec_contrast = librosa.feature.spectral_contrast(y=y, sr=sr, n_bands=n_bands, quantile=quantile)
+    spec_contrast = librosa.feature.spectral_contrast(y=y, sr=sr, n_bands=n_bands, quantile=quantile,
+                                                      n_fft=n_fft, hop_length=hop_length)
     return spec_contrast
 
 
@@ -106,7 +109,7 @@ def get_spectral_flatness(y, n_fft=2048, hop_length=512):
     return spec_flat
 
 
-def get_spectral_rolloff(y, sr=22050, roll_percent=0.85):
+def get_spectral_rolloff(y, sr=22050, roll_percent=0.85, n_fft=2048, hop_length=512):
     """Compute roll-off frequency.
 
     The roll-off frequency is defined for each frame as the center frequency
@@ -114,7 +117,8 @@ def get_spectral_rolloff(y, sr=22050, roll_percent=0.85):
     of the energy of the spectrum in this frame is contained in this bin and
     the bins below.
     """
-    spec_rolloff = librosa.feature.spectral_rolloff(y=y, sr=sr, roll_percent=roll_percent)[0]
+    spec_rolloff = librosa.feature.spectral_rolloff(y=y, sr=sr, roll_percent=roll_percent,
+                                                    n_fft=n_fft, hop_length=hop_length)[0]
     return spec_rolloff
 
 
@@ -127,29 +131,40 @@ def get_spectral_poly(y, sr=22050, order=1):
     return spec_poly
 
 
-def get_mfcc(y, sr=22050, n_mfcc=20):
-    mfccs = librosa.feature.mfcc(y=y, sr=sr, n_mfcc=n_mfcc)
+def get_mfcc(y, sr=22050, n_mfcc=20, n_fft=2048, hop_length=512):
+    mfccs = librosa.feature.mfcc(y=y, sr=sr, n_mfcc=n_mfcc, n_fft=n_fft, hop_length=hop_length)
     return mfccs
 
 
-def get_chromagram(y, sr=22050, hop_length=512, n_chroma=12, method='stft'):
+def get_chromagram(y, sr=22050, hop_length=512, n_chroma=12, method='stft', tuning=None, n_fft=2048):
+    """
+    Compute a chromagram (``n_fft`` is only used by the 'stft' method)
+
+    tuning : float or None
+        deviation from A440 tuning in fractional chroma bins / None estimates it from ``y``
+    """
     if method == 'stft':
-        chromagram = librosa.feature.chroma_stft(y=y, sr=sr, hop_length=hop_length, n_chroma=n_chroma)
+        chromagram = librosa.feature.chroma_stft(y=y, sr=sr, n_fft=n_fft, hop_length=hop_length, n_chroma=n_chroma,
+                                                 tuning=tuning)
     elif method == 'cqt':
-        chromagram = librosa.feature.chroma_cqt(y=y, sr=sr, hop_length=hop_length, n_chroma=n_chroma)
+        chromagram = librosa.feature.chroma_cqt(y=y, sr=sr, hop_length=hop_length, n_chroma=n_chroma,
+                                                tuning=tuning)
     elif method == 'cens':
-        chromagram = librosa.feature.chroma_cens(y=y, sr=sr, hop_length=hop_length, n_chroma=n_chroma)
+        chromagram = librosa.feature.chroma_cens(y=y, sr=sr, hop_length=hop_length, n_chroma=n_chroma,
+                                                 tuning=tuning)
     else:
         raise Exception("method: ['stft','cqt','cens']")
     return chromagram
 
 
-def get_tonnetz(y, sr=22050):
+def get_tonnetz(y, sr=22050, chroma=None, hop_length=512):
     """
     Computes the tonal centroid features (tonnetz)
 
+    chroma : np.ndarray or None
+        a precomputed chromagram / None computes a CQT chromagram from ``y``
     """
-    tonnetz = librosa.feature.tonnetz(y=y, sr=sr)
+    tonnetz = librosa.feature.tonnetz(y=y, sr=sr, chroma=chroma, hop_length=hop_length)
     return tonnetz
 
 
@@ -166,13 +181,13 @@ def get_rms(y, frame_length=2048, hop_length=512):
     return rms
 
 
-def get_onset_strength(y, sr=22050):
-    onset_str = librosa.onset.onset_strength(y=y, sr=sr)
+def get_onset_strength(y, sr=22050, n_fft=2048, hop_length=512):
+    onset_str = librosa.onset.onset_strength(y=y, sr=sr, n_fft=n_fft, hop_length=hop_length)
     return onset_str
 
 
-def get_bpm(y_perc, sr=22050, start_bpm=100, units='time', return_beats=False):
-    tempo, beats = librosa.beat.beat_track(y=y_perc, sr=sr, start_bpm=start_bpm, units=units)
+def get_bpm(y_perc, sr=22050, start_bpm=100, units='time', return_beats=False, hop_length=512):
+    tempo, beats = librosa.beat.beat_track(y=y_perc, sr=sr, start_bpm=start_bpm, units=units, hop_length=hop_length)
     out = tempo
     if return_beats is True:
         out = (tempo, beats)
@@ -0,0 +1,224 @@
+import os
+
+import numpy as np
+import pandas as pd
+import librosa
+
+from .features import get_y_from_audio
+from .aggregation import get_preset, _get_all_musical_features_from_y
+
+
+def get_fingerprint(y, sr=22050, n_fft=4096, hop_length=2048, n_segments=32, n_levels=4):
+    """
+    Coarse, quantised chroma signature of an audio time series.
+
+    The chromagram (fixed tuning, no estimation) is averaged over ``n_segments`` equal time
+    segments, normalised per segment and quantised to ``n_levels`` levels, so that re-encodes
+    of the same master give (nearly) the same fingerprint.
+
+    :param y: audio time series
+    :param sr: sampling rate
+    :param n_fft:
+    :param hop_length:
+    :param n_segments: (int) number of time segments
+    :param n_levels: (int) number of quantisation levels
+    :return: (np.ndarray [shape=(12 * n_segments,), dtype=uint8])
+    """
+    chroma = librosa.feature.chroma_stft(y=y, sr=sr, n_fft=n_fft, hop_length=hop_length, tuning=0.0)
+    bounds = np.linspace(0, chroma.shape[1], n_segments + 1).astype(int)
+    segments = np.stack([chroma[:, bounds[i]:max(bounds[i + 1], bounds[i] + 1)].mean(axis=1)
+                         for i in range(n_segments)], axis=1)
+    segments = librosa.util.normalize(np.nan_to_num(segments), norm=np.inf, axis=0)
+    fingerprint = np.round(segments * (n_levels - 1)).astype(np.uint8)
+    return fingerprint.ravel(order='F')
+
+
+class FingerprintIndex:
+    """
+    Index of the fingerprints already seen, with the feature vector extracted for each of them.
+
+    Two tracks are near-identical if their durations differ by at most ``max_duration_diff``
+    seconds and the mean absolute difference of their fingerprints (scaled to [0, 1]) is at
+    most ``threshold``.
+
+    Paramters
+    ---------
+    :param threshold: (float) max fingerprint distance of a duplicate
+        Default is 0.05
+    :param max_duration_diff: (float) max duration difference (in seconds) of a duplicate
+        Default is 0.5
+    :param n_levels: (int) number of quantisation levels of the fingerprints
+        Default is 4
+    """
+
+    def __init__(self, threshold=0.05, max_duration_diff=0.5, n_levels=4):
+        self.threshold = threshold
+        self.max_duration_diff = max_duration_diff
+        self.n_levels = n_levels
+        # growable contiguous storage, only the first len(self) rows are used
+        self._fingerprints = np.zeros((0, 0), dtype=np.uint8)
+        self._durations = np.zeros(0)
+        self.names = []
+        self.features = []
+        self.n_deduplicated = 0
+
+    def __len__(self):
+        return len(self.names)
+
+    @property
+    def fingerprints(self):
+        """(np.ndarray [shape=(n tracks, fingerprint length), dtype=uint8])"""
+        return self._fingerprints[:len(self)]
+
+    @property
+    def durations(self):
+        """(np.ndarray [shape=(n tracks,)]) durations in seconds"""
+        return self._durations[:len(self)]
+
+    def find(self, fingerprint, duration):
+        """
+        Closest near-identical track in the index.
+
+        :param fingerprint: fingerprint from ``get_fingerprint``
+        :param duration: (float) duration in seconds
+        :return: (position, distance) or (None, None) if there is no match
+            (``names[position]`` / ``get_features(position)`` of the matched track)
+        """
+        fingerprint = np.asarray(fingerprint, dtype=np.uint8)
+        if len(self) == 0 or self._fingerprints.shape[1] != len(fingerprint):
+            return None, None
+        fps = self.fingerprints
+        candidates = np.flatnonzero(np.abs(self.durations - duration) <= self.max_duration_diff)
+        if len(candidates) == 0:
+            return None, None
+        if len(candidates) < len(self):
+            fps = fps[candidates]
+        # |a - b| of uint8 without casting the whole matrix, summed in uint32
+        dists = (np.maximum(fps, fingerprint) - np.minimum(fps, fingerprint)).sum(axis=1, dtype=np.uint32)
+        best = int(np.argmin(dists))
+        dist = dists[best] / len(fingerprint) / (self.n_levels - 1)
+        if dist > self.threshold:
+            return None, None
+        return int(candidates[best]), float(dist)
+
+    def add(self, name, fingerprint, duration, features):
+        """
+        :param name: song name
+        :param fingerprint: fingerprint from ``get_fingerprint``
+        :param duration: (float) duration in seconds
+        :param features: (DataFrame) output of ``get_all_musical_features`` (n features × 1 column)
+        """
+        fingerprint = np.asarray(fingerprint, dtype=np.uint8)
+        n = len(self)
+        if n == 0 and self._fingerprints.shape[1] != len(fingerprint):
+            self._fingerprints = np.zeros((0, len(fingerprint)), dtype=np.uint8)
+        elif self._fingerprints.shape[1] != len(fingerprint):
+            raise Exception(f"fingerprint length {len(fingerprint)} differs from the index "
+                            f"({self._fingerprints.shape[1]})")
+        if n == len(self._fingerprints):
+            # amortised growth
+            capacity = max(16, 2 * n)
+            self._fingerprints = np.concatenate(
+                [self._fingerprints, np.zeros((capacity - n, len(fingerprint)), dtype=np.uint8)])
+            self._durations = np.concatenate([self._durations, np.zeros(capacity - n)])
+        self._fingerprints[n] = fingerprint
+        self._durations[n] = float(duration)
+        self.names.append(name)
+        self.features.append(features.iloc[:, 0].rename(name))
+
+    def get_features(self, position):
+        """Stored feature vector (n features × 1 column DataFrame) of the track at ``position``"""
+        return self.features[position].to_frame()
+
+    def save(self, path_index):
+        """
+        Save the index to a directory.
+
+        :param path_index: (string) directory path
+        """
+        os.makedirs(path_index, exist_ok=True)
+        np.save(os.path.join(path_index, 'fingerprints.npy'), self.fingerprints)
+        np.save(os.path.join(path_index, 'durations.npy'), self.durations)
+        df_features = pd.concat(self.features, axis=1) if len(self) > 0 else pd.DataFrame()
+        df_features.to_pickle(os.path.join(path_index, 'features.pkl'))
+        pd.Series({'threshold': self.threshold, 'max_duration_diff': self.max_duration_diff,
+                   'n_levels': self.n_levels, 'n_deduplicated': self.n_deduplicated}).to_json(
+            os.path.join(path_index, 'params.json'))
+
+    @classmethod
+    def load(cls, path_index):
+        """
+        Load an index saved with ``save``.
+
+        :param path_index: (string) directory path
+        :return: FingerprintIndex
+        """
+        params = pd.read_json(os.path.join(path_index, 'params.json'), typ='series')
+        index = cls(threshold=float(params['threshold']), max_duration_diff=float(params['max_duration_diff']),
+                    n_levels=int(params['n_levels']))
+        index.n_deduplicated = int(params.get('n_deduplicated', 0))
+        df_features = pd.read_pickle(os.path.join(path_index, 'features.pkl'))
+        # by position, song names are not necessarily unique
+        index.names = list(df_features.columns)
+        index.features = [df_features.iloc[:, i] for i in range(df_features.shape[1])]
+        index._fingerprints = np.load(os.path.join(path_index, 'fingerprints.npy')).astype(np.uint8)
+        if index._fingerprints.ndim != 2:
+            # empty index
+            index._fingerprints = index._fingerprints.reshape(0, 0)
+        index._durations = np.load(os.path.join(path_index, 'durations.npy')).astype(float)
+        return index
+
+
+def get_all_musical_features_dedup(paths_audio, song_names, index=None,
+                                   threshold=0.05, max_duration_diff=0.5,
+                                   duration=30, start=10, sr=None, **kwargs):
+    """
+    ``get_all_musical_features`` over many tracks, reusing the feature vector of a
+    near-identical track (re-encode, duplicate upload) instead of extracting it again.
+
+    Every track is loaded with ``get_y_from_audio`` and fingerprinted with ``get_fingerprint``;
+    if the index already has a near-identical fingerprint, its stored features are reused,
+    otherwise the features are extracted and the track is added to the index.
+    The stored features are reused as they are, so keep the extraction parameters the same
+    for a given index.
+
+    :param paths_audio: (list) file paths of the audios
+    :param song_names: (list) song names
+    :param index: (FingerprintIndex or None) index of the tracks already seen / None starts a new one
+    :param threshold: (float) max fingerprint distance of a duplicate (for a new index)
+    :param max_duration_diff: (float) max duration difference in seconds of a duplicate (for a new index)
+    :param duration: (int) see ``get_all_musical_features``
+    :param start: (int) see ``get_all_musical_features``
+    :param sr: (int) see ``get_all_musical_features``
+    :param kwargs: other parameters of ``get_all_musical_features``
+    :return: (audio_features, report, index)
+        DataFrame of n features × n songs,
+        DataFrame with the ``duplicate_of`` song (None if extracted) and the fingerprint ``distance`` of each song,
+        and the updated index. ``report['duplicate_of'].notna().sum()`` is the number of deduplicated tracks.
+    """
+    sr = get_preset(kwargs.get('preset', 'full'), sr=sr)['sr']
+    if index is None:
+        index = FingerprintIndex(threshold=threshold, max_duration_diff=max_duration_diff)
+
+    list_features = []
+    report = []
+    for path_audio, song_name in zip(paths_audio, song_names):
+        y = get_y_from_audio(path_audio, sr=sr, duration=duration, start=start)
+        fingerprint = get_fingerprint(y, sr=sr, n_levels=index.n_levels)
+        y_duration = len(y) / sr
+
+        match, dist = index.find(fingerprint, y_duration)
+        if match is not None:
+            audio_features = index.get_features(match)
+            audio_features.columns = [song_name]
+            index.n_deduplicated += 1
+        else:
+            audio_features = _get_all_musical_features_from_y(y, song_name, sr=sr, **kwargs)
+            index.add(song_name, fingerprint, y_duration, audio_features)
+        list_features.append(audio_features)
+        report.append({'song_name': song_name, 'duplicate_of': None if match is None else index.names[match],
+                       'distance': dist})
+
+    audio_features = pd.concat(list_features, axis=1)
+    report = pd.DataFrame(report).set_index('song_name')
+    return audio_features, report, index
@@ -0,0 +1,236 @@
+import time
+import threading
+
+import numpy as np
+import pandas as pd
+import soundfile
+
+from .features import get_y_from_audio
+from .aggregation import get_preset, _get_all_musical_features_from_y
+
+
+class PrefetchPipeline:
+    """
+    Batch extraction that decodes the next tracks in background threads while the
+    features of the current track are computed.
+
+    At most ``prefetch`` tracks are decoded ahead (being decoded or waiting), and their memory
+    is kept under ``max_prefetch_mb``. Before a track is decoded, the peak memory of its decoding
+    is reserved: ``librosa.load`` holds the audio at the native sampling rate with all its channels,
+    its mono mix and the resampled time series at the same time. The peak is estimated from the file
+    header (44.1 kHz stereo is assumed when the header cannot be read), and the reservation is
+    corrected to the size of the decoded time series once the track is decoded. The header is read
+    by the decoding threads outside of the lock, so the computation never waits on it.
+    The next track needed by the computation is always let in, so that a track larger than the cap
+    cannot block the pipeline. Tracks are yielded in the input order.
+
+    ``stats`` is updated while iterating:
+
+    - ``decode_time`` / ``compute_time``: total time spent decoding / computing features (seconds)
+    - ``compute_stall``: time the computation waited for a decoded track (I/O bound if large)
+    - ``decode_stall``: wall time during which no track was being decoded although decoders were
+      waiting for a free slot or memory, i.e. the decoded tracks were waiting for the computation
+      (compute bound if large)
+    - ``max_prefetched`` / ``max_prefetched_mb``: peak number / reserved size of the tracks decoded ahead
+      (being decoded or waiting)
+
+    Paramters
+    ---------
+    :param paths_audio: (list) file paths of the audios
+    :param song_names: (list) song names
+    :param prefetch: (int) number of tracks decoded ahead
+        Default is 2
+    :param max_prefetch_mb: (float) memory cap of the tracks decoded ahead, including the decoding peak (in MB)
+        Default is 512
+    :param n_decode_threads: (int) number of decoding threads
+        Default is 1
+    :param duration: (int) see ``get_all_musical_features``
+    :param start: (int) see ``get_all_musical_features``
+    :param sr: (int or None) see ``get_all_musical_features``
+    :param kwargs: other parameters of ``get_all_musical_features``
+
+    Example
+    -------
+    >>> pipeline = PrefetchPipeline(paths_audio, song_names, prefetch=4)
+    >>> for song_name, audio_features in pipeline:
+    ...     pass
+    >>> pipeline.stats
+    """
+
+    def __init__(self, paths_audio, song_names, prefetch=2, max_prefetch_mb=512, n_decode_threads=1,
+                 duration=30, start=10, sr=None, **kwargs):
+        if prefetch < 1:
+            raise Exception("prefetch must be at least 1")
+        self.paths_audio = list(paths_audio)
+        self.song_names = list(song_names)
+        self.prefetch = prefetch
+        self.max_prefetch_bytes = max_prefetch_mb * 1024 ** 2
+        self.n_decode_threads = n_decode_threads
+        self.duration = duration
+        self.start = start
+        self.sr = get_preset(kwargs.get('preset', 'full'), sr=sr)['sr']
+        self.kwargs = kwargs
+
+        self.stats = {'n_tracks': 0, 'decode_time': 0.0, 'compute_time': 0.0,
+                      'compute_stall': 0.0, 'decode_stall': 0.0, 'max_prefetched': 0, 'max_prefetched_mb': 0.0}
+
+    def _expected_bytes(self, path_audio):
+        """
+        Peak memory (in bytes) of ``get_y_from_audio``: the float32 audio at the native sampling rate
+        with all its channels, its mono mix and the resampled time series
+        """
+        try:
+            info = soundfile.info(path_audio)
+            native_sr, channels = info.samplerate, info.channels
+            seconds = max(0.0, info.duration - self.start)
+        except Exception:
+            native_sr, channels = 44100, 2
+            seconds = None
+        if self.duration is not None:
+            seconds = self.duration if seconds is None else min(seconds, self.duration)
+        elif seconds is None:
+            return 0
+        n_native = int(np.ceil(seconds * native_sr))
+        n_mono = n_native if channels > 1 else 0
+        n_resampled = int(np.ceil(seconds * self.sr)) if native_sr != self.sr else 0
+        return 4 * (n_native * channels + n_mono + n_resampled)
+
+    def _update_decode_stall(self):
+        """Start / stop the decode stall clock (call with the lock held)"""
+        stalled = self._n_waiting > 0 and self._n_decoding == 0
+        now = time.perf_counter()
+        if stalled and self._stall_start is None:
+            self._stall_start = now
+        elif not stalled and self._stall_start is not None:
+            self.stats['decode_stall'] += now - self._stall_start
+            self._stall_start = None
+
+    def _can_reserve(self, i, n_bytes):
+        # reservations are made in the input order
+        if i != self._next_reserve:
+            return False
+        return i == self._next_compute or self._prefetched_bytes + n_bytes <= self.max_prefetch_bytes
+
+    def _decode(self):
+        while True:
+            with self._cond:
+                # claim the next track when a prefetch slot is free
+                self._n_waiting += 1
+                self._update_decode_stall()
+                while (not self._stop and self._next_decode < len(self.paths_audio)
+                       and self._next_decode - self._next_compute >= self.prefetch):
+                    self._cond.wait()
+                self._n_waiting -= 1
+                if self._stop or self._next_decode >= len(self.paths_audio):
+                    self._update_decode_stall()
+                    return
+                i = self._next_decode
+                self._next_decode += 1
+                self._n_decoding += 1
+                self._update_decode_stall()
+
+            # file I/O outside of the lock
+            n_bytes = self._expected_bytes(self.paths_audio[i])
+
+            with self._cond:
+                # reserve the memory of the decoding
+                self._n_decoding -= 1
+                self._n_waiting += 1
+                self._update_decode_stall()
+                while not self._stop and not self._can_reserve(i, n_bytes):
+                    self._cond.wait()
+                self._n_waiting -= 1
+                if self._stop:
+                    self._update_decode_stall()
+                    return
+                self._next_reserve += 1
+                self._prefetched_bytes += n_bytes
+                self._n_decoding += 1
+                self._update_decode_stall()
+                self.stats['max_prefetched'] = max(self.stats['max_prefetched'],
+                                                   self._next_reserve - self._next_compute)
+                self.stats['max_prefetched_mb'] = max(self.stats['max_prefetched_mb'],
+                                                      self._prefetched_bytes / 1024 ** 2)
+                self._cond.notify_all()
+
+            t0 = time.perf_counter()
+            try:
+                y = get_y_from_audio(self.paths_audio[i], sr=self.sr, duration=self.duration, start=self.start)
+                item = (y, None)
+            except Exception as e:
+                y = None
+                item = (None, e)
+            decode_time = time.perf_counter() - t0
+
+            with self._cond:
+                self.stats['decode_time'] += decode_time
+                # correct the reservation to the actual size
+                self._prefetched_bytes += (0 if y is None else y.nbytes) - n_bytes
+                self._queue[i] = item
+                self._n_decoding -= 1
+                self._update_decode_stall()
+                self._cond.notify_all()
+
+    def __iter__(self):
+        self._cond = threading.Condition()
+        self._queue = {}
+        self._prefetched_bytes = 0
+        self._next_decode = 0
+        self._next_reserve = 0
+        self._next_compute = 0
+        self._n_waiting = 0
+        self._n_decoding = 0
+        self._stall_start = None
+        self._stop = False
+        threads = [threading.Thread(target=self._decode, daemon=True) for _ in range(self.n_decode_threads)]
+        for thread in threads:
+            thread.start()
+        try:
+            for i, song_name in enumerate(self.song_names):
+                with self._cond:
+                    t0 = time.perf_counter()
+                    while i not in self._queue:
+                        self._cond.wait()
+                    self.stats['compute_stall'] += time.perf_counter() - t0
+                    y, error = self._queue.pop(i)
+                    self._prefetched_bytes -= 0 if y is None else y.nbytes
+                    self._next_compute = i + 1
+                    self._cond.notify_all()
+                if error is not None:
+                    raise error
+
+                t0 = time.perf_counter()
+                audio_features = _get_all_musical_features_from_y(y, song_name, sr=self.sr, **self.kwargs)
+                self.stats['compute_time'] += time.perf_counter() - t0
+                self.stats['n_tracks'] += 1
+                yield song_name, audio_features
+        finally:
+            with self._cond:
+                self._stop = True
+                self._cond.notify_all()
+            for thread in threads:
+                thread.join()
+            with self._cond:
+                self._n_waiting = 0
+                self._update_decode_stall()
+
+
+def get_all_musical_features_pipelined(paths_audio, song_names, prefetch=2, max_prefetch_mb=512,
+                                       n_decode_threads=1, **kwargs):
+    """
+    ``get_all_musical_features`` over many tracks with decoding prefetched in background threads,
+    see ``PrefetchPipeline``.
+
+    :param paths_audio: (list) file paths of the audios
+    :param song_names: (list) song names
+    :param prefetch: (int) number of tracks decoded ahead
+    :param max_prefetch_mb: (float) memory cap of the tracks decoded ahead, including the decoding peak (in MB)
+    :param n_decode_threads: (int) number of decoding threads
+    :param kwargs: other parameters of ``get_all_musical_features``
+    :return: (audio_features, stats)
+        DataFrame of n features × n songs, and the dict of pipeline stats (times in seconds)
+    """
+    pipeline = PrefetchPipeline(paths_audio, song_names, prefetch=prefetch, max_prefetch_mb=max_prefetch_mb,
+                                n_decode_threads=n_decode_threads, **kwargs)
+    audio_features = pd.concat([df for _, df in pipeline], axis=1)
+    return audio_features, pipeline.stats
@@ -0,0 +1,268 @@
+import time
+from collections import deque
+
+import numpy as np
+import pandas as pd
+import librosa
+
+_STATS = ['mean', 'std', 'skew', 'kurt', 'max', 'min']
+
+
+def _get_window_stats(X):
+    """
+    Stats of every column of X (n_frames × n_features) as a (n_features × 6) array,
+    in the order of ``get_stats_from_df`` and with the same (pandas) definitions:
+    sample std, bias-corrected skewness and excess kurtosis.
+    """
+    n = len(X)
+    mean = X.mean(axis=0)
+    adjusted = X - mean
+    adjusted2 = adjusted ** 2
+    m2 = adjusted2.sum(axis=0)
+    m3 = (adjusted2 * adjusted).sum(axis=0)
+    m4 = (adjusted2 ** 2).sum(axis=0)
+    # pandas zeroes out floating point noise of the central moments
+    m2 = np.where(np.abs(m2) < 1e-14, 0.0, m2)
+    m3 = np.where(np.abs(m3) < 1e-14, 0.0, m3)
+    m4 = np.where(np.abs(m4) < 1e-14, 0.0, m4)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        std = np.sqrt(m2 / (n - 1)) if n > 1 else np.full_like(mean, np.nan)
+        if n > 2:
+            skew = np.where(m2 == 0, 0.0, n * (n - 1) ** 0.5 / (n - 2) * m3 / m2 ** 1.5)
+        else:
+            skew = np.full_like(mean, np.nan)
+        if n > 3:
+            denominator = (n - 2) * (n - 3) * m2 ** 2
+            kurt = np.where(denominator == 0, 0.0,
+                            n * (n + 1) * (n - 1) * m4 / denominator - 3 * (n - 1) ** 2 / ((n - 2) * (n - 3)))
+        else:
+            kurt = np.full_like(mean, np.nan)
+    return np.stack([mean, std, skew, kurt, X.max(axis=0), X.min(axis=0)], axis=1)
+
+
+class RealtimeExtractor:
+    """
+    Stateful frame-level feature extractor over incoming audio blocks.
+
+    Blocks of any size are buffered and every STFT frame is computed as soon as all of its
+    samples have arrived, so the per-block work only grows with the block size. The frames
+    are the same as the offline (``center=True``) functions of ``features.py`` on the
+    concatenated blocks: ``get_rms``, ``get_zero_crossing_rate``, ``get_spectral_centroids``,
+    ``get_spectral_rolloff`` (0.99 and 0.01), ``get_spectral_flatness``, ``get_mfcc``,
+    ``get_chromagram(method='stft', tuning=tuning)`` and ``get_onset_strength``.
+
+    The frames at the end of the stream (within ``n_fft // 2`` samples) are emitted by ``flush``.
+
+    MFCC and onset strength clip the dB mel spectrogram at ``top_db`` below its maximum.
+    Offline this is the maximum of the whole signal, here it is the running maximum,
+    so only the bins more than ``top_db`` below a later louder frame can differ.
+
+    Paramters
+    ---------
+    :param sr: (int) sampling rate of the blocks
+    :param n_fft: (int) FFT window / frame length
+    :param hop_length: (int) number of samples between frames
+    :param n_mfcc: (int) number of MFCC
+    :param tuning: (float) tuning deviation (in chroma bins) for the chromagram,
+        fixed because it cannot be estimated from the whole signal in real time
+    :param window: (int) number of frames of the sliding window for the stats
+    :param stats: (list or None) stats of the sliding window, see ``get_feature_stats``
+    :param top_db: (float) threshold of the dB mel spectrogram for MFCC and onset strength
+    :param stream_name: (string) column name of the sliding-window stats
+
+    Example
+    -------
+    >>> extractor = RealtimeExtractor(sr=22050)
+    >>> for block in blocks:
+    ...     df_frames, df_stats = extractor.process_block(block)
+    >>> df_frames, df_stats = extractor.flush()
+    """
+
+    pitch_class = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
+
+    def __init__(self, sr=22050, n_fft=2048, hop_length=512, n_mfcc=12, tuning=0.0,
+                 window=43, stats=None, top_db=80.0, stream_name='stream'):
+        if n_fft % 2 != 0:
+            raise Exception("n_fft must be even")
+        self.sr = sr
+        self.n_fft = n_fft
+        self.hop_length = hop_length
+        self.n_mfcc = n_mfcc
+        self.tuning = tuning
+        self.window = window
+        self.stats = stats
+        self.top_db = top_db
+        self.stream_name = stream_name
+
+        self._chroma_fb = librosa.filters.chroma(sr=sr, n_fft=n_fft, tuning=tuning)
+        self._mel_fb = librosa.filters.mel(sr=sr, n_fft=n_fft)
+        # lag=1 frame + centering compensation, as in librosa.onset.onset_strength
+        self._onset_delay = 1 + n_fft // (2 * hop_length)
+
+        self.columns = (['rms', 'zero_crossing_rate', 'spectral_centroid', 'spectral_rolloff_max',
+                         'spectral_rolloff_min', 'spectral_flatness', 'onset_strength']
+                        + [f'mfcc_{i}' for i in range(1, n_mfcc + 1)]
+                        + [f'chroma_stft_{i}' for i in self.pitch_class])
+        # selected stats and row names of the sliding-window stats, as in ``get_feature_stats``
+        stats_ = _STATS if stats is None else list(stats)
+        self._stats_idx = [_STATS.index(j) for j in stats_]
+        self._stats_index = [f'{i}_{j}' for i in self.columns for j in stats_]
+        self._no_frames = pd.DataFrame(columns=self.columns, index=pd.RangeIndex(0, name='frame'), dtype=float)
+        self.reset()
+
+    def reset(self):
+        """Forget the stream state to start a new stream"""
+        self._buffer = np.zeros(0, dtype=np.float32)
+        self._buffer_start = 0  # absolute index of the first buffered sample
+        self._n_samples = 0
+        self._n_frames = 0
+        self._first_sample = None
+        self._db_max = -np.inf
+        self._mel_db_tail = deque(maxlen=self._onset_delay)
+        # ring buffer of the last ``window`` frames
+        self._history = np.zeros((self.window, len(self.columns)))
+        self._n_history = 0
+        self._history_pos = 0
+        self._window_stats = None
+        self._finished = False
+        self.last_latency = 0.0
+        self.max_latency = 0.0
+
+    def _segment(self, t0, t1, pad_mode):
+        """Padded samples covering the frames t0, ..., t1-1 (``center=True`` framing)"""
+        half = self.n_fft // 2
+        lo = t0 * self.hop_length - half
+        hi = (t1 - 1) * self.hop_length + half
+        y = self._buffer[max(lo, 0) - self._buffer_start:min(hi, self._n_samples) - self._buffer_start]
+        pad = (max(0, -lo), max(0, hi - self._n_samples))
+        if pad_mode == 'edge':
+            # 'edge' pads with the first and the last sample of the whole stream
+            return np.concatenate([np.full(pad[0], self._first_sample, dtype=np.float32), y,
+                                   np.full(pad[1], self._buffer[-1] if len(self._buffer) > 0 else 0,
+                                           dtype=np.float32)])
+        return np.pad(y, pad, mode='constant')
+
+    def _power_to_db(self, S):
+        S_db = 10.0 * np.log10(np.maximum(1e-10, S))
+        if self.top_db is not None:
+            self._db_max = max(self._db_max, S_db.max())
+            S_db = np.maximum(S_db, self._db_max - self.top_db)
+        return S_db
+
+    def _compute_frames(self, t0, t1):
+        n_fft, hop_length, sr = self.n_fft, self.hop_length, self.sr
+        y_const = self._segment(t0, t1, pad_mode='constant')
+        y_edge = self._segment(t0, t1, pad_mode='edge')
+
+        rms = librosa.feature.rms(y=y_const, frame_length=n_fft, hop_length=hop_length, center=False)[0]
+        zcr = librosa.feature.zero_crossing_rate(y=y_edge, frame_length=n_fft, hop_length=hop_length,
+                                                 center=False)[0]
+
+        S = np.abs(librosa.stft(y=y_const, n_fft=n_fft, hop_length=hop_length, center=False))
+        S_pow = S ** 2
+        spec_centr = librosa.feature.spectral_centroid(S=S, sr=sr, n_fft=n_fft)[0]
+        spec_rolloff_max = librosa.feature.spectral_rolloff(S=S, sr=sr, n_fft=n_fft, roll_percent=.99)[0]
+        spec_rolloff_min = librosa.feature.spectral_rolloff(S=S, sr=sr, n_fft=n_fft, roll_percent=.01)[0]
+        spec_flat = librosa.feature.spectral_flatness(S=S, n_fft=n_fft)[0]
+
+        mel_db = self._power_to_db(self._mel_fb @ S_pow)
+        mfccs = librosa.feature.mfcc(S=mel_db, n_mfcc=self.n_mfcc)
+
+        # onset strength of frame t: mean positive difference between mel frames t-d+1 and t-d
+        d = self._onset_delay
+        n_tail = len(self._mel_db_tail)
+        mel_db_all = mel_db if n_tail == 0 else np.concatenate([np.array(self._mel_db_tail).T, mel_db], axis=1)
+        onset_str = np.zeros(t1 - t0)
+        for j, t in enumerate(range(t0, t1)):
+            if t >= d:
+                k = t - t0 + n_tail  # column of frame t in mel_db_all
+                onset_str[j] = np.mean(np.maximum(0.0, mel_db_all[:, k - d + 1] - mel_db_all[:, k - d]))
+        for k in range(mel_db.shape[1]):
+            self._mel_db_tail.append(mel_db[:, k])
+
+        chroma = librosa.util.normalize(self._chroma_fb @ S_pow, norm=np.inf, axis=-2)
+
+        feats = np.vstack([rms, zcr, spec_centr, spec_rolloff_max, spec_rolloff_min, spec_flat,
+                           onset_str, mfccs, chroma]).T
+        df_frames = pd.DataFrame(feats, columns=self.columns, index=pd.RangeIndex(t0, t1, name='frame'))
+        return df_frames
+
+    def _add_history(self, feats):
+        """Push new frames to the ring buffer and update the sliding-window stats"""
+        feats = feats[-self.window:]
+        idx = (self._history_pos + np.arange(len(feats))) % self.window
+        self._history[idx] = feats
+        self._history_pos = (self._history_pos + len(feats)) % self.window
+        self._n_history = min(self.window, self._n_history + len(feats))
+
+        stats = _get_window_stats(self._history[:self._n_history])[:, self._stats_idx]
+        self._window_stats = pd.DataFrame({self.stream_name: stats.ravel()}, index=self._stats_index)
+
+    def _emit(self, n_frames, t_start):
+        if n_frames > self._n_frames:
+            df_frames = self._compute_frames(self._n_frames, n_frames)
+            self._n_frames = n_frames
+            self._add_history(df_frames.to_numpy())
+        else:
+            df_frames = self._no_frames
+
+        # drop the samples no longer needed by the next frame
+        keep_from = self._n_frames * self.hop_length - self.n_fft // 2
+        if keep_from > self._buffer_start and not self._finished:
+            self._buffer = self._buffer[keep_from - self._buffer_start:]
+            self._buffer_start = keep_from
+
+        df_stats = self._window_stats
+        self.last_latency = time.perf_counter() - t_start
+        self.max_latency = max(self.max_latency, self.last_latency)
+        return df_frames, df_stats
+
+    def process_block(self, block):
+        """
+        Add a block of samples and compute the frames it completes.
+
+        :param block: (array) mono audio samples at ``sr``
+        :return: (df_frames, df_stats)
+            DataFrame of the new frames (one row per frame) and the sliding-window stats
+            (DataFrame of n features × 1 column, or None before the first frame;
+            the same DataFrame is returned again when the block completes no frame)
+        """
+        t_start = time.perf_counter()
+        if self._finished is True:
+            raise Exception("the stream is flushed, call reset() to start a new one")
+        block = np.asarray(block, dtype=np.float32).ravel()
+        if self._first_sample is None and len(block) > 0:
+            self._first_sample = block[0]
+        self._buffer = np.concatenate([self._buffer, block])
+        self._n_samples += len(block)
+
+        half = self.n_fft // 2
+        n_frames = 0 if self._n_samples < half else 1 + (self._n_samples - half) // self.hop_length
+        return self._emit(n_frames, t_start)
+
+    def flush(self):
+        """
+        End the stream and compute the remaining frames (padded like the offline functions).
+
+        :return: (df_frames, df_stats)
+        """
+        t_start = time.perf_counter()
+        self._finished = True
+        n_frames = 0 if self._n_samples == 0 else 1 + self._n_samples // self.hop_length
+        return self._emit(n_frames, t_start)
+
+
+def iter_realtime_features(blocks, sr=22050, **kwargs):
+    """
+    Run a ``RealtimeExtractor`` over a block generator.
+
+    :param blocks: (iterable) mono audio blocks, e.g. from a sound card callback queue
+    :param sr: (int) sampling rate
+    :param kwargs: other parameters of ``RealtimeExtractor``
+    :return: generator of (df_frames, df_stats), one per block and one for the end of the stream
+    """
+    extractor = RealtimeExtractor(sr=sr, **kwargs)
+    for block in blocks:
+        yield extractor.process_block(block)
+    yield extractor.flush()
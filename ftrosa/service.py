@@ -0,0 +1,341 @@
+import os
+import json
+import math
+import time
+import queue
+import inspect
+import threading
+import multiprocessing
+from collections import deque, Counter
+import concurrent.futures
+from concurrent.futures import Future
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import numpy as np
+
+from .aggregation import get_all_musical_features, _get_all_musical_features_from_y
+
+
+_PARAMS = list(inspect.signature(get_all_musical_features).parameters)
+
+
+class ServiceBusy(Exception):
+    """Raised when the request queue of an ``ExtractionService`` is full"""
+
+
+class ServiceClosed(Exception):
+    """Raised when a request is submitted to a closed ``ExtractionService``"""
+
+
+_results = None
+
+
+def _init_worker(ready, results, warmup=True):
+    """
+    Import librosa and trigger the numba JIT once, so that the first request does not pay for it,
+    then report to the ``ready`` queue
+    """
+    global _results
+    _results = results
+    if warmup is True:
+        sr = 22050
+        t = np.arange(3 * sr) / sr
+        y = (0.5 * np.sin(2 * np.pi * 440 * t) * (np.sin(2 * np.pi * 2 * t) > 0)).astype(np.float32)
+        _get_all_musical_features_from_y(y, 'warmup')
+    ready.put(True)
+
+
+def _extract_batch(batch):
+    """
+    Run ``get_all_musical_features`` for a micro-batch of (request id, kwargs) inside a worker.
+    Every result is sent to the result queue as soon as its request is done.
+    """
+    for request_id, kwargs in batch:
+        try:
+            df = get_all_musical_features(**kwargs)
+            features = df.iloc[:, 0].astype(float)
+            result = (True, {k: (None if np.isnan(v) else v) for k, v in features.items()})
+        except Exception as e:
+            result = (False, f'{type(e).__name__}: {e}')
+        _results.put((request_id, os.getpid()) + result)
+
+
+class ExtractionService:
+    """
+    Warm worker pool for ``get_all_musical_features`` with a bounded request queue.
+
+    Every free worker takes the next request. Only when requests pile up in the queue, a worker
+    takes a micro-batch of about (queue depth / ``n_workers``) requests (at most ``max_batch_size``)
+    in one round-trip; the result of every request is returned as soon as it is done.
+    At most one batch per worker is in flight, the rest waits in the queue;
+    when the queue is full, ``submit`` raises ``ServiceBusy``.
+
+    The constructor returns once every worker has started (and warmed up).
+
+    Paramters
+    ---------
+    :param n_workers: (int) number of worker processes
+    :param max_batch_size: (int) max number of requests in a micro-batch
+    :param max_queue_size: (int) max number of queued requests
+    :param warmup: (bool) if True, every worker runs a short extraction at start-up
+    :param latency_window: (int) number of recent requests used for the latency percentiles
+    :param startup_timeout: (float) max time (in seconds) to wait for the workers to be ready
+    """
+
+    def __init__(self, n_workers=2, max_batch_size=4, max_queue_size=64,
+                 warmup=True, latency_window=1000, startup_timeout=600):
+        self.n_workers = n_workers
+        self.max_batch_size = max_batch_size
+        self.max_queue_size = max_queue_size
+
+        ctx = multiprocessing.get_context('spawn')
+        ready = ctx.Queue()
+        self._results = ctx.Queue()
+        self._pool = ctx.Pool(n_workers, initializer=_init_worker, initargs=(ready, self._results, warmup))
+        deadline = time.perf_counter() + startup_timeout
+        try:
+            for _ in range(n_workers):
+                ready.get(timeout=max(0.0, deadline - time.perf_counter()))
+        except queue.Empty:
+            self._pool.terminate()
+            raise Exception(f"the workers were not ready after {startup_timeout} seconds")
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._slots = threading.Semaphore(n_workers)
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=latency_window)
+        self._batch_sizes = deque(maxlen=latency_window)
+        self._worker_requests = Counter()
+        self._pending = {}
+        self._next_id = 0
+        self._n_in_flight = 0
+        self._n_completed = 0
+        self._n_failed = 0
+        self._n_rejected = 0
+        self._closed = False
+        self._drained = False
+
+        self._dispatcher = threading.Thread(target=self._dispatch, daemon=True)
+        self._dispatcher.start()
+        self._collector = threading.Thread(target=self._collect, daemon=True)
+        self._collector.start()
+
+    def submit(self, **kwargs):
+        """
+        Queue one extraction request.
+
+        :param kwargs: parameters of ``get_all_musical_features``
+        :return: (Future) result is a dict {feature name: value}
+        """
+        unknown = set(kwargs) - set(_PARAMS)
+        if len(unknown) > 0:
+            raise TypeError(f"unknown parameters: {sorted(unknown)}")
+        for name in ('path_audio', 'song_name'):
+            if name not in kwargs:
+                raise TypeError(f"missing parameter: {name}")
+        if self._closed is True:
+            raise ServiceClosed("the service is closed")
+
+        future = Future()
+        try:
+            self._queue.put_nowait((kwargs, future, time.perf_counter()))
+        except queue.Full:
+            with self._lock:
+                self._n_rejected += 1
+            raise ServiceBusy(f"request queue is full ({self.max_queue_size})")
+        return future
+
+    def extract(self, timeout=None, **kwargs):
+        """Blocking version of ``submit``, returns the dict of features"""
+        return self.submit(**kwargs).result(timeout=timeout)
+
+    def _dispatch(self):
+        while True:
+            # wait for a free worker first, so that requests keep waiting (and count) in the queue
+            self._slots.acquire()
+            item = self._queue.get()
+            if item is None:
+                self._slots.release()
+                break
+            # batch only the backlog, spread over all the workers
+            batch_size = min(self.max_batch_size, math.ceil((1 + self._queue.qsize()) / self.n_workers))
+            batch = [item]
+            while len(batch) < batch_size:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._queue.put(None)
+                    break
+                batch.append(item)
+
+            request_ids = []
+            with self._lock:
+                for kwargs, future, t_submit in batch:
+                    self._pending[self._next_id] = (future, t_submit)
+                    request_ids.append(self._next_id)
+                    self._next_id += 1
+                self._n_in_flight += len(batch)
+                self._batch_sizes.append(len(batch))
+            self._pool.apply_async(_extract_batch, (list(zip(request_ids, [kwargs for kwargs, _, _ in batch])),),
+                                   callback=lambda _, request_ids=request_ids: self._done(request_ids),
+                                   error_callback=lambda e, request_ids=request_ids: self._done(request_ids, e))
+
+    def _collect(self):
+        while True:
+            try:
+                request_id, pid, ok, value = self._results.get(timeout=0.1)
+            except queue.Empty:
+                with self._lock:
+                    if self._drained is True and len(self._pending) == 0:
+                        break
+                continue
+            self._resolve(request_id, ok, value, pid=pid)
+
+    def _resolve(self, request_id, ok, value, pid=None):
+        with self._lock:
+            if request_id not in self._pending:
+                return
+            future, t_submit = self._pending.pop(request_id)
+            self._n_in_flight -= 1
+            self._latencies.append(time.perf_counter() - t_submit)
+            if pid is not None:
+                self._worker_requests[pid] += 1
+            if ok is True:
+                self._n_completed += 1
+            else:
+                self._n_failed += 1
+        if ok is True:
+            future.set_result(value)
+        else:
+            future.set_exception(Exception(value))
+
+    def _done(self, request_ids, error=None):
+        self._slots.release()
+        if error is not None:
+            # the batch failed as a whole (e.g. unpicklable parameters)
+            for request_id in request_ids:
+                self._resolve(request_id, False, f'{type(error).__name__}: {error}')
+
+    def get_stats(self):
+        """
+        Queue depth, counters, number of requests done by each worker
+        and latency percentiles (in milliseconds) of the recent requests.
+
+        :return: (dict)
+        """
+        with self._lock:
+            latencies = np.array(self._latencies) * 1000
+            batch_sizes = np.array(self._batch_sizes)
+            stats = {'queue_depth': self._queue.qsize(), 'in_flight': self._n_in_flight,
+                     'completed': self._n_completed, 'failed': self._n_failed, 'rejected': self._n_rejected,
+                     'mean_batch_size': float(batch_sizes.mean()) if len(batch_sizes) > 0 else None,
+                     'requests_per_worker': sorted(self._worker_requests.values(), reverse=True)}
+        for p in (50, 90, 99):
+            stats[f'latency_p{p}_ms'] = float(np.percentile(latencies, p)) if len(latencies) > 0 else None
+        return stats
+
+    def close(self):
+        """Stop the dispatcher after the queued requests and terminate the workers"""
+        self._closed = True
+        self._queue.put(None)
+        self._dispatcher.join()
+        for _ in range(self.n_workers):
+            self._slots.acquire()
+        with self._lock:
+            self._drained = True
+        self._collector.join()
+        self._pool.terminate()
+        self._pool.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _make_handler(service, timeout):
+    class _Handler(BaseHTTPRequestHandler):
+        def _send(self, code, body, headers=None):
+            data = json.dumps(body).encode()
+            self.send_response(code)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            for k, v in (headers or {}).items():
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path == '/stats':
+                self._send(200, service.get_stats())
+            else:
+                self._send(404, {'error': 'not found'})
+
+        def do_POST(self):
+            if self.path != '/extract':
+                self._send(404, {'error': 'not found'})
+                return
+            try:
+                kwargs = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+                future = service.submit(**kwargs)
+            except ServiceBusy as e:
+                self._send(503, {'error': str(e)}, headers={'Retry-After': '1'})
+                return
+            except ServiceClosed as e:
+                self._send(503, {'error': str(e)})
+                return
+            except (TypeError, ValueError, AttributeError) as e:
+                self._send(400, {'error': str(e)})
+                return
+            try:
+                features = future.result(timeout=timeout)
+            except concurrent.futures.TimeoutError:
+                self._send(504, {'error': 'extraction timed out'})
+                return
+            except Exception as e:
+                self._send(500, {'error': str(e)})
+                return
+            self._send(200, {'song_name': kwargs['song_name'], 'features': features})
+
+        def log_message(self, format, *args):
+            pass
+    return _Handler
+
+
+def serve(host='127.0.0.1', port=8765, timeout=300, **kwargs):
+    """
+    Run a local HTTP extraction service until interrupted.
+
+    ``POST /extract`` with a JSON object of ``get_all_musical_features`` parameters returns
+    ``{"song_name": ..., "features": {...}}`` (503 when the queue is full).
+    ``GET /stats`` returns the queue depth, counters and latency percentiles.
+
+    :param host: (string) host to bind, localhost by default
+    :param port: (int) port to bind
+    :param timeout: (float) max time (in seconds) to wait for an extraction
+    :param kwargs: parameters of ``ExtractionService``
+    """
+    with ExtractionService(**kwargs) as service:
+        server = ThreadingHTTPServer((host, port), _make_handler(service, timeout))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='ftrosa local extraction service')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--n-workers', type=int, default=2)
+    parser.add_argument('--max-batch-size', type=int, default=4)
+    parser.add_argument('--max-queue-size', type=int, default=64)
+    args = parser.parse_args()
+    serve(host=args.host, port=args.port, n_workers=args.n_workers, max_batch_size=args.max_batch_size,
+          max_queue_size=args.max_queue_size)
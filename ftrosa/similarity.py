@@ -0,0 +1,354 @@
+import os
+import json
+
+import numpy as np
+import pandas as pd
+
+
+def _to_matrix(df_features, names=None, feature_names=None):
+    """
+    Convert features to a (n_tracks × n_features) float matrix.
+
+    A DataFrame is expected in the layout of ``get_all_musical_features``
+    (features as rows, one column per song), e.g. ``pd.concat(list_of_outputs, axis=1)``.
+    An array is expected as (n_tracks × n_features).
+    """
+    if isinstance(df_features, pd.DataFrame):
+        if feature_names is not None:
+            missing = set(feature_names) - set(df_features.index)
+            if len(missing) > 0:
+                raise Exception(f"missing features: {sorted(missing)[:5]}")
+            df_features = df_features.loc[list(feature_names)]
+        X = df_features.T.to_numpy(dtype=np.float64)
+        names = np.array(df_features.columns, dtype=str)
+        feature_names = np.array(df_features.index, dtype=str)
+    else:
+        X = np.atleast_2d(np.asarray(df_features, dtype=np.float64))
+        if names is None:
+            names = np.arange(len(X)).astype(str)
+        names = np.asarray(names, dtype=str)
+    if len(names) != len(X):
+        raise Exception("names must have one entry per track")
+    return X, names, feature_names
+
+
+def _sq_distances(Q, X, x_sq_norms):
+    """Squared euclidean distances between every row of Q and every row of X"""
+    q_sq_norms = np.einsum('ij,ij->i', Q, Q)
+    d2 = q_sq_norms[:, None] - 2 * (Q @ X.T) + x_sq_norms[None, :]
+    return np.maximum(d2, 0)
+
+
+def _merge_topk(best_d, best_i, d, i, k):
+    """Merge the current best k (distance, index) pairs of each row with new candidates"""
+    d = np.concatenate([best_d, d], axis=1)
+    i = np.concatenate([best_i, i], axis=1)
+    if d.shape[1] > k:
+        part = np.argpartition(d, k - 1, axis=1)[:, :k]
+        d = np.take_along_axis(d, part, axis=1)
+        i = np.take_along_axis(i, part, axis=1)
+    return d, i
+
+
+def _kmeans(X, n_clusters, n_iter=10, random_state=0, chunk_size=65536):
+    """Plain Lloyd's k-means, returning float32 centroids"""
+    rng = np.random.default_rng(random_state)
+    centroids = X[rng.choice(len(X), size=n_clusters, replace=False)].astype(np.float32)
+    for _ in range(n_iter):
+        assign = _assign(X, centroids, chunk_size=chunk_size)
+        counts = np.bincount(assign, minlength=n_clusters)
+        empty = counts == 0
+        order = np.argsort(assign, kind='stable')
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])[~empty]
+        sums = np.add.reduceat(X[order].astype(np.float64), starts, axis=0)
+        centroids[~empty] = (sums / counts[~empty, None]).astype(np.float32)
+        # re-seed empty clusters with random points
+        if empty.any():
+            centroids[empty] = X[rng.choice(len(X), size=int(empty.sum()), replace=False)]
+    return centroids
+
+
+def _assign(X, centroids, chunk_size=65536):
+    """Index of the nearest centroid for every row of X"""
+    c_sq_norms = np.einsum('ij,ij->i', centroids, centroids)
+    assign = np.empty(len(X), dtype=np.int64)
+    for s in range(0, len(X), chunk_size):
+        assign[s:s + chunk_size] = _sq_distances(X[s:s + chunk_size], centroids, c_sq_norms).argmin(axis=1)
+    return assign
+
+
+class SimilarityIndex:
+    """
+    Nearest-neighbour index over the aggregate feature vectors of ``get_all_musical_features``.
+
+    Vectors are standardised per feature, optionally projected with PCA, and searched
+    either exactly (brute force in batches) or approximately with an inverted file
+    (k-means coarse quantiser, only the ``n_probe`` nearest clusters are scanned).
+
+    Paramters
+    ---------
+    :param standardize: (bool)
+        If True, every feature is scaled to zero mean and unit variance before indexing
+        Default is True
+
+    :param n_components: (int or None)
+        Number of PCA components to keep / None keeps all (standardised) features
+        Default is None
+
+    :param n_clusters: (int or None)
+        Number of k-means clusters for approximate search / None means exact search only
+        Default is None
+
+    :param n_probe: (int)
+        Number of clusters to scan per query in approximate search
+        Default is 8
+
+    :param random_state: (int)
+        Seed for PCA / k-means training samples
+        Default is 0
+
+    Example
+    -------
+    >>> df = pd.concat([get_all_musical_features(p, n) for p, n in zip(paths, names)], axis=1)
+    >>> index = SimilarityIndex(n_components=32).fit(df)
+    >>> neighbours, distances = index.query(df[['my song']], k=10)
+    """
+
+    _arrays = ['vectors', 'sq_norms', 'names', 'mean', 'scale', 'components', 'centroids', 'assign']
+
+    def __init__(self, standardize=True, n_components=None, n_clusters=None, n_probe=8, random_state=0):
+        self.standardize = standardize
+        self.n_components = n_components
+        self.n_clusters = n_clusters
+        self.n_probe = n_probe
+        self.random_state = random_state
+
+        self.feature_names = None
+        self.mean = None
+        self.scale = None
+        self.components = None
+        self.centroids = None
+        self.vectors = None
+        self.sq_norms = None
+        self.names = None
+        self.assign = None
+        self._order = None
+        self._offsets = None
+
+    def __len__(self):
+        return 0 if self.vectors is None else len(self.vectors)
+
+    def transform(self, X, chunk_size=65536):
+        """
+        Standardise (and project) raw feature rows into the index space.
+
+        NaN features (e.g. the skewness of a constant feature) are mapped to the feature mean.
+        """
+        out = []
+        for s in range(0, len(X), chunk_size):
+            Xs = (X[s:s + chunk_size] - self.mean) / self.scale
+            Xs = np.nan_to_num(Xs, nan=0.0, posinf=0.0, neginf=0.0)
+            if self.components is not None:
+                Xs = Xs @ self.components.T
+            out.append(Xs.astype(np.float32))
+        if len(out) == 0:
+            return np.empty((0, len(self.mean) if self.components is None else len(self.components)), np.float32)
+        return np.concatenate(out, axis=0)
+
+    def fit(self, df_features, names=None, max_train_size=100000):
+        """
+        Fit the standardisation, PCA and k-means on ``df_features`` and index them.
+
+        :param df_features: (DataFrame or array) features × tracks DataFrame or (n_tracks × n_features) array
+        :param names: track names when ``df_features`` is an array
+        :param max_train_size: (int) max number of tracks used to fit PCA and k-means
+        :return: self
+        """
+        X, names, self.feature_names = _to_matrix(df_features, names=names)
+        rng = np.random.default_rng(self.random_state)
+        train = X if len(X) <= max_train_size else X[rng.choice(len(X), size=max_train_size, replace=False)]
+
+        if self.standardize is True:
+            self.mean = np.nan_to_num(np.nanmean(train, axis=0))
+            scale = np.nan_to_num(np.nanstd(train, axis=0))
+            scale[scale == 0] = 1.0
+            self.scale = scale
+        else:
+            self.mean = np.zeros(X.shape[1])
+            self.scale = np.ones(X.shape[1])
+
+        self.components = None
+        if self.n_components is not None:
+            train_s = self.transform(train)
+            train_s = train_s - train_s.mean(axis=0)
+            _, _, Vt = np.linalg.svd(train_s, full_matrices=False)
+            self.components = Vt[:self.n_components].astype(np.float32)
+
+        self.vectors = self.transform(X)
+        self.sq_norms = np.einsum('ij,ij->i', self.vectors, self.vectors)
+        self.names = names
+
+        self.centroids, self.assign = None, None
+        if self.n_clusters is not None:
+            n_clusters = min(self.n_clusters, len(X))
+            train_idx = rng.choice(len(X), size=min(len(X), max_train_size), replace=False)
+            self.centroids = _kmeans(self.vectors[train_idx], n_clusters, random_state=self.random_state)
+            self.assign = _assign(self.vectors, self.centroids)
+        self._build_lists()
+        return self
+
+    def add(self, df_features, names=None):
+        """
+        Add new tracks to a fitted index.
+
+        The standardisation, PCA and clusters fitted in ``fit`` are kept as they are,
+        so refit from time to time if the catalogue drifts a lot.
+
+        Every array is concatenated in memory: on an index loaded with ``mmap=True`` this drops
+        the memory map and copies the whole index, on every call. Add new tracks in large batches
+        and ``save`` / ``load`` again to get back to a memory-mapped index.
+
+        :param df_features: (DataFrame or array) features × tracks DataFrame or (n_tracks × n_features) array
+        :param names: track names when ``df_features`` is an array
+        :return: self
+        """
+        if self.vectors is None:
+            raise Exception("the index is not fitted yet, call fit() first")
+        X, names, _ = _to_matrix(df_features, names=names, feature_names=self.feature_names)
+        vectors = self.transform(X)
+        self.vectors = np.concatenate([self.vectors, vectors], axis=0)
+        self.sq_norms = np.concatenate([self.sq_norms, np.einsum('ij,ij->i', vectors, vectors)])
+        self.names = np.concatenate([self.names, names])
+        if self.centroids is not None:
+            self.assign = np.concatenate([self.assign, _assign(vectors, self.centroids)])
+        self._build_lists()
+        return self
+
+    def _build_lists(self):
+        """Inverted lists: track indices sorted by cluster and the start offset of every cluster"""
+        if self.assign is None:
+            self._order, self._offsets = None, None
+            return
+        self._order = np.argsort(self.assign, kind='stable')
+        self._offsets = np.searchsorted(self.assign[self._order], np.arange(len(self.centroids) + 1))
+
+    def _search_exact(self, Q, k, chunk_size=65536):
+        best_d = np.full((len(Q), 0), np.inf, dtype=np.float32)
+        best_i = np.full((len(Q), 0), -1, dtype=np.int64)
+        for s in range(0, len(self.vectors), chunk_size):
+            d = _sq_distances(Q, self.vectors[s:s + chunk_size], self.sq_norms[s:s + chunk_size])
+            i = np.broadcast_to(np.arange(s, s + d.shape[1]), d.shape)
+            best_d, best_i = _merge_topk(best_d, best_i, d, i, k)
+        return best_d, best_i
+
+    def _search_ivf(self, Q, k, n_probe):
+        c_sq_norms = np.einsum('ij,ij->i', self.centroids, self.centroids)
+        n_probe = min(n_probe, len(self.centroids))
+        probes = np.argsort(_sq_distances(Q, self.centroids, c_sq_norms), axis=1)
+        sizes = np.diff(self._offsets)
+
+        best_d = np.full((len(Q), k), np.inf, dtype=np.float32)
+        best_i = np.full((len(Q), k), -1, dtype=np.int64)
+        for q in range(len(Q)):
+            # probe more clusters when the n_probe nearest hold fewer than k tracks
+            n_probe_q = max(n_probe, int(np.searchsorted(np.cumsum(sizes[probes[q]]), k)) + 1)
+            cand = np.concatenate([self._order[self._offsets[c]:self._offsets[c + 1]] for c in probes[q, :n_probe_q]])
+            if len(cand) == 0:
+                continue
+            d = _sq_distances(Q[q:q + 1], self.vectors[cand], self.sq_norms[cand])[0]
+            top = np.argpartition(d, k - 1)[:k] if len(d) > k else np.arange(len(d))
+            best_d[q, :len(top)] = d[top]
+            best_i[q, :len(top)] = cand[top]
+        return best_d, best_i
+
+    def query(self, df_features, k=10, names=None, exact=None, n_probe=None, batch_size=1024):
+        """
+        k nearest tracks of every query track.
+
+        In approximate search, more than ``n_probe`` clusters are scanned when the ``n_probe``
+        nearest clusters hold fewer than ``k`` tracks, so that ``k`` neighbours are always returned.
+
+        :param df_features: (DataFrame or array) features × tracks DataFrame or (n_tracks × n_features) array
+        :param k: (int) number of neighbours
+        :param names: query names when ``df_features`` is an array
+        :param exact: (bool or None) force exact search / None uses approximate search if the index has clusters
+        :param n_probe: (int or None) override the number of clusters scanned per query
+        :param batch_size: (int) number of queries searched at once
+        :return: (neighbours, distances) DataFrames, one row per query and one column per rank
+        """
+        if self.vectors is None:
+            raise Exception("the index is not fitted yet, call fit() first")
+        X, q_names, _ = _to_matrix(df_features, names=names, feature_names=self.feature_names)
+        Q = self.transform(X)
+        k = min(k, len(self))
+        if exact is None:
+            exact = self.centroids is None
+        if exact is False and self.centroids is None:
+            raise Exception("approximate search needs an index fitted with n_clusters")
+        n_probe = self.n_probe if n_probe is None else n_probe
+
+        dists, idxs = [], []
+        for s in range(0, len(Q), batch_size):
+            if exact is True:
+                d, i = self._search_exact(Q[s:s + batch_size], k)
+            else:
+                d, i = self._search_ivf(Q[s:s + batch_size], k, n_probe)
+            order = np.argsort(d, axis=1)
+            dists.append(np.sqrt(np.take_along_axis(d, order, axis=1)))
+            idxs.append(np.take_along_axis(i, order, axis=1))
+        dists = np.concatenate(dists, axis=0) if len(dists) > 0 else np.empty((0, k))
+        idxs = np.concatenate(idxs, axis=0) if len(idxs) > 0 else np.empty((0, k), dtype=np.int64)
+
+        columns = list(range(1, k + 1))
+        neighbours = np.where(idxs >= 0, np.asarray(self.names)[idxs], None)
+        df_neighbours = pd.DataFrame(neighbours, index=q_names, columns=columns)
+        df_distances = pd.DataFrame(dists, index=q_names, columns=columns)
+        return df_neighbours, df_distances
+
+    def save(self, path_index):
+        """
+        Save the index to a directory of .npy files (so that it can be memory-mapped by ``load``).
+
+        :param path_index: (string) directory path
+        """
+        os.makedirs(path_index, exist_ok=True)
+        # write to temporary files and move them into place, so that saving over the directory
+        # a memory-mapped index was loaded from never truncates the files being read
+        for name in self._arrays:
+            value = getattr(self, name)
+            path_array = os.path.join(path_index, f'{name}.npy')
+            if value is not None:
+                path_tmp = os.path.join(path_index, f'{name}.tmp.npy')
+                np.save(path_tmp, np.asarray(value))
+                os.replace(path_tmp, path_array)
+            elif os.path.exists(path_array):
+                os.remove(path_array)
+        params = {'standardize': self.standardize, 'n_components': self.n_components,
+                  'n_clusters': self.n_clusters, 'n_probe': self.n_probe, 'random_state': self.random_state,
+                  'feature_names': None if self.feature_names is None else list(self.feature_names)}
+        path_tmp = os.path.join(path_index, 'params.tmp.json')
+        with open(path_tmp, 'w') as f:
+            json.dump(params, f)
+        os.replace(path_tmp, os.path.join(path_index, 'params.json'))
+
+    @classmethod
+    def load(cls, path_index, mmap=True):
+        """
+        Load an index saved with ``save``.
+
+        :param path_index: (string) directory path
+        :param mmap: (bool) if True, the vectors are memory-mapped instead of read in memory
+        :return: SimilarityIndex
+        """
+        with open(os.path.join(path_index, 'params.json')) as f:
+            params = json.load(f)
+        feature_names = params.pop('feature_names')
+        index = cls(**params)
+        index.feature_names = None if feature_names is None else np.array(feature_names, dtype=str)
+        for name in cls._arrays:
+            path_array = os.path.join(path_index, f'{name}.npy')
+            if os.path.exists(path_array):
+                mmap_mode = 'r' if mmap is True and name in ('vectors', 'sq_norms', 'assign') else None
+                setattr(index, name, np.load(path_array, mmap_mode=mmap_mode))
+        index._build_lists()
+        return index
@@ -0,0 +1,84 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from ftrosa.fingerprint import FingerprintIndex, get_fingerprint
+
+SR = 22050
+
+
+def _features(name, value):
+    return pd.DataFrame({name: [value, 2 * value]}, index=['feature_1', 'feature_2'])
+
+
+def _random_fingerprints(n, seed=0):
+    return np.random.default_rng(seed).integers(0, 4, size=(n, 384)).astype(np.uint8)
+
+
+def test_find_matches_brute_force():
+    fingerprints = _random_fingerprints(200)
+    durations = np.where(np.arange(200) % 2 == 0, 30.0, 12.0)
+    index = FingerprintIndex(threshold=0.05)
+    for i, (fingerprint, duration) in enumerate(zip(fingerprints, durations)):
+        index.add(f'track_{i}', fingerprint, duration, _features(f'track_{i}', float(i)))
+
+    query = fingerprints[42].copy()
+    query[:10] = (query[:10] + 1) % 4
+    position, dist = index.find(query, 30.2)
+    assert position == 42
+    assert dist == pytest.approx(np.abs(fingerprints[42].astype(int) - query).mean() / 3)
+
+    # the duration filter
+    assert index.find(fingerprints[42], 12.0) == (None, None)
+    assert index.find(fingerprints[43], 12.0)[0] == 43
+    # no near-identical track
+    assert index.find(_random_fingerprints(1, seed=1)[0], 30.0) == (None, None)
+
+
+def test_fingerprint_of_reencode():
+    t = np.arange(10 * SR) / SR
+    freqs = 220 * 2 ** (np.floor(t) % 7 / 12)  # one note per second
+    y = (0.3 * np.sin(2 * np.pi * np.cumsum(freqs) / SR)).astype(np.float32)
+    y_noisy = y + 0.001 * np.random.default_rng(0).normal(size=len(y)).astype(np.float32)
+    index = FingerprintIndex()
+    index.add('original', get_fingerprint(y, sr=SR), 10.0, _features('original', 1.0))
+    assert index.find(get_fingerprint(y_noisy, sr=SR), 10.0)[0] == 0
+
+
+def test_save_load_empty_index(tmp_path):
+    index = FingerprintIndex(threshold=0.1)
+    index.save(str(tmp_path / 'index'))
+    loaded = FingerprintIndex.load(str(tmp_path / 'index'))
+
+    assert len(loaded) == 0
+    assert loaded.threshold == 0.1
+    assert loaded.find(_random_fingerprints(1)[0], 30.0) == (None, None)
+    loaded.add('track', _random_fingerprints(1)[0], 30.0, _features('track', 1.0))
+    assert loaded.find(_random_fingerprints(1)[0], 30.0)[0] == 0
+
+
+def test_save_load_n_deduplicated(tmp_path):
+    index = FingerprintIndex()
+    index.add('track', _random_fingerprints(1)[0], 30.0, _features('track', 1.0))
+    index.n_deduplicated = 3
+    index.save(str(tmp_path / 'index'))
+    assert FingerprintIndex.load(str(tmp_path / 'index')).n_deduplicated == 3
+
+
+def test_duplicate_song_names_by_position(tmp_path):
+    fingerprints = _random_fingerprints(2)
+    index = FingerprintIndex()
+    index.add('same name', fingerprints[0], 30.0, _features('same name', 1.0))
+    index.add('same name', fingerprints[1], 30.0, _features('same name', 5.0))
+
+    for index_ in (index, _save_load(index, tmp_path)):
+        position, _ = index_.find(fingerprints[1], 30.0)
+        assert position == 1
+        assert index_.names[position] == 'same name'
+        assert list(index_.get_features(position).iloc[:, 0]) == [5.0, 10.0]
+        assert list(index_.get_features(0).iloc[:, 0]) == [1.0, 2.0]
+
+
+def _save_load(index, tmp_path):
+    index.save(str(tmp_path / 'index'))
+    return FingerprintIndex.load(str(tmp_path / 'index'))
@@ -0,0 +1,88 @@
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+import soundfile
+
+from ftrosa import get_all_musical_features
+from ftrosa.pipeline import PrefetchPipeline, get_all_musical_features_pipelined
+
+SR = 22050
+KWARGS = {'duration': 3, 'start': 0, 'preset': 'fast'}
+
+
+@pytest.fixture(scope='module')
+def paths_audio(tmp_path_factory):
+    path_dir = tmp_path_factory.mktemp('audio')
+    rng = np.random.default_rng(0)
+    paths = []
+    for i in range(5):
+        sr = 44100 if i == 2 else SR
+        t = np.arange(3 * sr) / sr
+        y = 0.3 * np.sin(2 * np.pi * (220 + 55 * i) * t) * (1 + np.sin(2 * np.pi * 2 * t))
+        y = y + 0.01 * rng.normal(size=len(t))
+        if i == 3:
+            y = np.stack([y, 0.5 * y], axis=1)  # stereo
+        path = str(path_dir / f'track_{i}.wav')
+        soundfile.write(path, y.astype(np.float32), sr)
+        paths.append(path)
+    return paths
+
+
+@pytest.fixture(scope='module')
+def df_sequential(paths_audio):
+    return pd.concat([get_all_musical_features(path, f'track_{i}', **KWARGS) for i, path in enumerate(paths_audio)],
+                     axis=1)
+
+
+@pytest.mark.parametrize('prefetch, n_decode_threads', [(1, 1), (2, 3), (4, 2)])
+def test_order_matches_sequential(paths_audio, df_sequential, prefetch, n_decode_threads):
+    df, stats = get_all_musical_features_pipelined(paths_audio, list(df_sequential.columns), prefetch=prefetch,
+                                                   n_decode_threads=n_decode_threads, **KWARGS)
+    pd.testing.assert_frame_equal(df, df_sequential)
+    assert stats['n_tracks'] == len(paths_audio)
+    assert stats['max_prefetched'] <= prefetch
+
+
+def test_memory_cap(paths_audio):
+    _, stats = get_all_musical_features_pipelined(paths_audio, [f'track_{i}' for i in range(5)], prefetch=3,
+                                                  n_decode_threads=3, max_prefetch_mb=0.001, **KWARGS)
+    assert stats['n_tracks'] == 5
+    assert stats['max_prefetched'] == 1
+
+
+def test_expected_bytes(paths_audio):
+    pipeline = PrefetchPipeline(paths_audio, range(5), **KWARGS)
+    n_out = 3 * pipeline.sr
+    # native mono at 22050 Hz, resampled
+    assert pipeline._expected_bytes(paths_audio[0]) == 4 * (3 * SR + n_out)
+    # native mono at 44100 Hz, resampled
+    assert pipeline._expected_bytes(paths_audio[2]) == 4 * (3 * 44100 + n_out)
+    # native stereo, its mono mix, resampled
+    assert pipeline._expected_bytes(paths_audio[3]) == 4 * (3 * SR * 2 + 3 * SR + n_out)
+
+
+def test_error_propagation(paths_audio):
+    paths = paths_audio[:2] + ['does_not_exist.wav'] + paths_audio[2:]
+    n_threads = threading.active_count()
+    pipeline = PrefetchPipeline(paths, [f'song_{i}' for i in range(len(paths))], prefetch=3,
+                                n_decode_threads=2, **KWARGS)
+    song_names = []
+    with pytest.raises(Exception):
+        for song_name, _ in pipeline:
+            song_names.append(song_name)
+    assert song_names == ['song_0', 'song_1']
+    assert threading.active_count() == n_threads
+
+
+def test_early_break(paths_audio):
+    n_threads = threading.active_count()
+    pipeline = PrefetchPipeline(paths_audio, [f'track_{i}' for i in range(5)], prefetch=2, n_decode_threads=2,
+                                **KWARGS)
+    iterator = iter(pipeline)
+    song_name, df = next(iterator)
+    assert song_name == 'track_0' and list(df.columns) == ['track_0']
+    iterator.close()
+    assert pipeline.stats['n_tracks'] == 1
+    assert threading.active_count() == n_threads
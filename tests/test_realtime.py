@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from ftrosa.features import (get_rms, get_zero_crossing_rate, get_spectral_centroids, get_spectral_rolloff,
+                             get_spectral_flatness, get_mfcc, get_chromagram, get_onset_strength)
+from ftrosa.feature_stats import get_feature_stats
+from ftrosa.realtime import RealtimeExtractor, iter_realtime_features
+
+SR = 22050
+
+
+@pytest.fixture(scope='module')
+def y():
+    rng = np.random.default_rng(0)
+    t = np.arange(int(SR * 5.3)) / SR
+    y = 0.3 * np.sin(2 * np.pi * 440 * t) * (1 + np.sin(2 * np.pi * 2 * t)) + 0.05 * rng.normal(size=len(t))
+    y = y.astype(np.float32)
+    y[:3] = -0.2  # the edge padding of the zero-crossing rate differs from zero padding
+    return y
+
+
+@pytest.fixture(scope='module')
+def df_offline(y):
+    offline = {'rms': get_rms(y),
+               'zero_crossing_rate': get_zero_crossing_rate(y),
+               'spectral_centroid': get_spectral_centroids(y),
+               'spectral_rolloff_max': get_spectral_rolloff(y, roll_percent=.99),
+               'spectral_rolloff_min': get_spectral_rolloff(y, roll_percent=.01),
+               'spectral_flatness': get_spectral_flatness(y),
+               'onset_strength': get_onset_strength(y)}
+    mfccs = get_mfcc(y, n_mfcc=12)
+    for i in range(12):
+        offline[f'mfcc_{i + 1}'] = mfccs[i]
+    chromagram = get_chromagram(y, tuning=0.0)
+    for i, pc in enumerate(RealtimeExtractor.pitch_class):
+        offline[f'chroma_stft_{pc}'] = chromagram[i]
+    return pd.DataFrame(offline)
+
+
+def _blocks(y, block_size):
+    for s in range(0, len(y), block_size):
+        yield y[s:s + block_size]
+
+
+@pytest.mark.parametrize('block_size', [100, 333, 512, 1000, 4096])
+def test_matches_offline_features(y, df_offline, block_size):
+    outputs = list(iter_realtime_features(_blocks(y, block_size), sr=SR))
+    df_frames = pd.concat([df for df, _ in outputs])
+
+    assert len(outputs) == len(range(0, len(y), block_size)) + 1
+    assert list(df_frames.index) == list(range(len(df_offline)))
+    for c in df_offline.columns:
+        scale = np.abs(df_offline[c]).max() + 1e-9
+        np.testing.assert_allclose(df_frames[c].to_numpy() / scale, df_offline[c].to_numpy() / scale,
+                                   atol=1e-5, err_msg=c)
+
+
+def test_window_stats_match_get_feature_stats(y):
+    extractor = RealtimeExtractor(sr=SR, window=20, stats=['mean', 'std', 'skew', 'kurt'])
+    frames = []
+    for block in _blocks(y, 700):
+        df_frames, df_stats = extractor.process_block(block)
+        frames.append(df_frames)
+        df_window = pd.concat(frames).iloc[-20:]
+        if len(df_window) == 0:
+            assert df_stats is None
+            continue
+        df_expected = get_feature_stats(df_window, stats=['mean', 'std', 'skew', 'kurt'], song_name='stream')
+        assert list(df_stats.index) == list(df_expected.index)
+        np.testing.assert_allclose(df_stats.to_numpy(), df_expected.to_numpy(), rtol=1e-6, atol=1e-9)
@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+import soundfile
+
+from ftrosa.service import ExtractionService, ServiceClosed
+
+SR = 22050
+
+
+@pytest.fixture(scope='module')
+def paths_audio(tmp_path_factory):
+    path_dir = tmp_path_factory.mktemp('audio')
+    rng = np.random.default_rng(0)
+    t = np.arange(4 * SR) / SR
+    paths = []
+    for i in range(4):
+        y = 0.3 * np.sin(2 * np.pi * (220 + 110 * i) * t) * (np.sin(2 * np.pi * 2 * t) > 0)
+        y = y + 0.01 * rng.normal(size=len(t))
+        path = str(path_dir / f'track_{i}.wav')
+        soundfile.write(path, y.astype(np.float32), SR)
+        paths.append(path)
+    return paths
+
+
+@pytest.fixture(scope='module')
+def service():
+    service = ExtractionService(n_workers=4, max_batch_size=4, warmup=True)
+    yield service
+    service.close()
+
+
+def test_concurrent_requests_spread_over_workers(service, paths_audio):
+    futures = [service.submit(path_audio=path, song_name=f'track_{i}', duration=4, start=0)
+               for i, path in enumerate(paths_audio)]
+    results = [future.result(timeout=300) for future in futures]
+
+    assert all(len(features) > 0 for features in results)
+    stats = service.get_stats()
+    assert stats['mean_batch_size'] == 1.0
+    assert stats['requests_per_worker'] == [1, 1, 1, 1]
+    assert stats['completed'] == 4 and stats['in_flight'] == 0
+
+
+def test_failed_request(service):
+    future = service.submit(path_audio='does_not_exist.wav', song_name='missing', duration=4, start=0)
+    with pytest.raises(Exception):
+        future.result(timeout=300)
+    assert service.get_stats()['failed'] >= 1
+
+
+def test_submit_after_close(paths_audio):
+    service = ExtractionService(n_workers=1, warmup=False)
+    service.close()
+    with pytest.raises(ServiceClosed):
+        service.submit(path_audio=paths_audio[0], song_name='track_0')
@@ -0,0 +1,88 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from ftrosa.similarity import SimilarityIndex
+
+
+@pytest.fixture(scope='module')
+def X():
+    rng = np.random.default_rng(0)
+    centers = rng.normal(scale=3.0, size=(20, 30))
+    X = centers[rng.integers(20, size=2000)] + rng.normal(size=(2000, 30))
+    return X * rng.uniform(0.1, 10, size=30) + rng.normal(size=30)
+
+
+def _brute_force(X, Q, k):
+    mean, scale = X.mean(axis=0), X.std(axis=0)
+    Xs, Qs = (X - mean) / scale, (Q - mean) / scale
+    d = np.sqrt(((Qs[:, None, :] - Xs[None, :, :]) ** 2).sum(axis=2))
+    order = np.argsort(d, axis=1)[:, :k]
+    return order, np.take_along_axis(d, order, axis=1)
+
+
+def test_exact_search_matches_brute_force(X):
+    Q = X[:50] + 0.1
+    index = SimilarityIndex().fit(X)
+    neighbours, distances = index.query(Q, k=5, exact=True)
+    expected, expected_d = _brute_force(X, Q, 5)
+
+    np.testing.assert_array_equal(neighbours.to_numpy(), expected.astype(str))
+    np.testing.assert_allclose(distances.to_numpy(), expected_d, rtol=1e-4, atol=1e-4)
+
+
+def test_dataframe_layout(X):
+    df = pd.DataFrame(X[:100].T, index=[f'feature_{i}' for i in range(30)],
+                      columns=[f'song_{i}' for i in range(100)])
+    index = SimilarityIndex().fit(df)
+    neighbours, _ = index.query(df[['song_7']].iloc[::-1], k=3)
+    assert list(neighbours.index) == ['song_7']
+    assert neighbours.loc['song_7', 1] == 'song_7'
+
+
+def test_ivf_search(X):
+    Q = X[:50] + 0.1
+    index = SimilarityIndex(n_clusters=20, n_probe=20).fit(X)
+    exact, _ = index.query(Q, k=5, exact=True)
+    # scanning every cluster is exact
+    approx, _ = index.query(Q, k=5, exact=False)
+    np.testing.assert_array_equal(approx.to_numpy(), exact.to_numpy())
+    # scanning a few clusters finds most of the neighbours of clustered data
+    approx, _ = index.query(Q, k=5, exact=False, n_probe=3)
+    recall = np.mean([len(set(a) & set(e)) / 5 for a, e in zip(approx.to_numpy(), exact.to_numpy())])
+    assert recall > 0.9
+
+
+def test_ivf_probes_more_clusters_than_n_probe(X):
+    index = SimilarityIndex(n_clusters=400, n_probe=1).fit(X)
+    neighbours, distances = index.query(X[:50], k=50, exact=False)
+    assert neighbours.notna().all().all()
+    assert np.isfinite(distances.to_numpy()).all()
+
+
+def test_pca(X):
+    index = SimilarityIndex(n_components=30).fit(X)
+    neighbours, _ = index.query(X[:50], k=5, exact=True)
+    expected, _ = _brute_force(X, X[:50], 5)
+    # all the components keep the distances
+    np.testing.assert_array_equal(neighbours.to_numpy(), expected.astype(str))
+
+
+def test_save_mmap_load_resave(X, tmp_path):
+    path_index = str(tmp_path / 'index')
+    index = SimilarityIndex(n_components=10, n_clusters=20).fit(X[:1500], names=np.arange(1500))
+    index.save(path_index)
+
+    loaded = SimilarityIndex.load(path_index, mmap=True)
+    assert isinstance(loaded.vectors, np.memmap)
+    loaded.add(X[1500:], names=np.arange(1500, 2000))
+    loaded.save(path_index)  # over the directory it was memory-mapped from
+
+    reloaded = SimilarityIndex.load(path_index, mmap=True)
+    assert len(reloaded) == 2000
+    index.add(X[1500:], names=np.arange(1500, 2000))
+    for exact in (True, False):
+        neighbours, distances = reloaded.query(X[:50], k=5, exact=exact)
+        expected, expected_d = index.query(X[:50], k=5, exact=exact)
+        pd.testing.assert_frame_equal(neighbours, expected)
+        pd.testing.assert_frame_equal(distances, expected_d)